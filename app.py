@@ -1,17 +1,99 @@
-
 """
 Sistema de Detección de Tránsito con IA
 Aplicación principal para conteo y clasificación de vehículos
 """
 
+import argparse
+import time
 import tkinter as tk
 from gui.main_window import MainWindow
+from gui.detector_manager import DetectorManager
+from gui.config import AppConfig
+
+def parse_args():
+    """Argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Sistema de Detección de Tránsito con IA")
+    parser.add_argument("--config", help="Archivo de configuración YAML/TOML (ver config.example.yaml)")
+    parser.add_argument("--headless", action="store_true", help="Ejecutar sin interfaz gráfica")
+    parser.add_argument("--fuente", help="Fuente de video: nombre definido en la configuración, archivo, índice de cámara o URL RTSP")
+    parser.add_argument("--servidor", action="store_true", help="Iniciar el servidor HTTP/WebSocket en vivo")
+    parser.add_argument("--host", help="Dirección del servidor en vivo (por defecto 127.0.0.1)")
+    parser.add_argument("--puerto", type=int, help="Puerto del servidor en vivo (por defecto 8080)")
+    parser.add_argument("--metricas", type=int, metavar="PUERTO", help="Exponer métricas Prometheus en este puerto")
+    parser.add_argument("--checkpoints", metavar="DIRECTORIO", help="Guardar checkpoints periódicos y reanudar desde el último")
+    parser.add_argument("--nueva-sesion", action="store_true", help="Ignorar el checkpoint existente y empezar de cero")
+    parser.add_argument("--filtro-movimiento", action="store_true", help="Saltar la inferencia en frames sin movimiento")
+    return parser.parse_args()
+
+def apply_args(detector_manager, args):
+    """Aplicar fuente, servidor y filtro de la línea de comandos sobre la configuración"""
+    if args.fuente is not None:
+        if args.fuente in detector_manager.config.source_names:
+            if detector_manager.source_settings['nombre'] != args.fuente:
+                detector_manager.seleccionar_fuente(args.fuente)
+        else:
+            detector_manager.set_video_source(int(args.fuente) if args.fuente.isdigit() else args.fuente)
+            
+    server_settings = detector_manager.config.outputs['servidor']
+    if args.servidor or server_settings:
+        server_settings = server_settings or {}
+        options = {
+            'host': args.host or server_settings.get('host', "127.0.0.1"),
+            'port': args.puerto or server_settings.get('puerto', 8080)
+        }
+        if server_settings.get('calidad_jpeg') is not None:
+            options['jpeg_quality'] = server_settings['calidad_jpeg']
+        detector_manager.iniciar_servidor(**options)
+        
+    metrics_settings = detector_manager.config.outputs['metricas']
+    if args.metricas or metrics_settings:
+        metrics_settings = metrics_settings or {}
+        detector_manager.iniciar_metricas(
+            metrics_settings.get('host', "127.0.0.1"), args.metricas or metrics_settings.get('puerto', 9100)
+        )
+        
+    if args.checkpoints:
+        detector_manager.configurar_checkpoints(args.checkpoints)
+    if args.nueva_sesion:
+        detector_manager.resume_checkpoint = False
+        
+    if args.filtro_movimiento:
+        detector_manager.configurar_filtro_movimiento()
+
+def config_source(args, config):
+    """Nombre de la fuente de configuración pedida con --fuente (None si es una ruta o no se indicó)"""
+    return args.fuente if args.fuente in config.source_names else None
+
+def run_headless(args, config):
+    """Ejecutar la detección sin ventana hasta Ctrl+C"""
+    detector_manager = DetectorManager(config=config, source_name=config_source(args, config))
+    apply_args(detector_manager, args)
+        
+    detector_manager.iniciar_deteccion()
+    try:
+        while detector_manager.detecting:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detector_manager.detener_deteccion()
+        detector_manager.detener_servidor()
+        detector_manager.detener_metricas()
 
 def main():
     """Función principal de la aplicación"""
+    args = parse_args()
+    config = AppConfig(args.config)
+    if args.headless:
+        run_headless(args, config)
+        return
+        
     root = tk.Tk()
-    app = MainWindow(root)
+    app = MainWindow(root, config, config_source(args, config))
+    apply_args(app.detector_manager, args)
     root.mainloop()
+    app.detector_manager.detener_servidor()
+    app.detector_manager.detener_metricas()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
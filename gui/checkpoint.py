@@ -0,0 +1,220 @@
+"""
+Checkpoints periódicos y reanudación de sesiones largas de detección
+
+Cada pocos segundos un hilo propio toma el último CounterSnapshot publicado
+(sin locks) junto con la posición en la fuente y escribe:
+
+    history-<id>.jsonl       registros de vehículos, solo los nuevos desde el checkpoint anterior
+    trajectories-<id>.jsonl  resúmenes de trayectorias terminadas, igual
+    state.json               conteos, IDs, posición, diarios vigentes y cuántos bytes de cada uno son válidos
+
+Los diarios se escriben y sincronizan antes que state.json, y state.json se
+reemplaza de forma atómica (archivo temporal + fsync + os.replace): si el
+proceso muere a mitad de escritura queda el checkpoint anterior completo, y
+lo que sobre al final de los diarios se descarta al cargar. Cuando los
+diarios empiezan de cero (nueva sesión, reanudación o datos limpiados) se
+escriben en archivos nuevos; los anteriores se borran solo después de que
+state.json apunte a los nuevos.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+def _read_journal(path, size):
+    """Leer los primeros `size` bytes de un diario JSONL"""
+    if not size:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read(size)
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+class Checkpointer:
+    """Checkpoints atómicos del estado de conteo y la posición en la fuente"""
+
+    def __init__(self, directory, interval=5.0):
+        self.directory = Path(directory)
+        self.interval = interval  # Segundos entre checkpoints
+        self.state_path = self.directory / "state.json"
+        self.journal_paths = {'history': None, 'trajectories': None}  # Diarios de la generación en curso
+
+        self.thread = None
+        self.running = False
+        self._stop_event = threading.Event()
+        self._detector_manager = None
+        self._generation = None
+        self._journaled = {'history': None, 'trajectories': None}  # (entradas, bytes); None = sin escribir
+
+        self.checkpoints_written = 0
+        self.last_checkpoint_ms = 0.0
+
+    def load(self, source):
+        """Último checkpoint de esta fuente (None si no hay, está dañado o es de otra fuente)"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('format_version') != FORMAT_VERSION:
+                print(f"Checkpoint ignorado: formato {state.get('format_version')} no soportado")
+                return None
+            if state['source'] != str(source):
+                print(f"Checkpoint ignorado: corresponde a otra fuente ({state['source']})")
+                return None
+            # Checkpoints anteriores a los diarios por generación usan nombres fijos
+            history_path = self.directory / state.get('history_file', "history.jsonl")
+            trajectories_path = self.directory / state.get('trajectories_file', "trajectories.jsonl")
+            history = _read_journal(history_path, state['history_bytes'])
+            trajectories = _read_journal(trajectories_path, state['trajectories_bytes'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Checkpoint ignorado por estar dañado: {e}")
+            return None
+
+        for entry in history:
+            entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
+        state['history'] = history
+        state['trajectories'] = trajectories
+        return state
+
+    def discard(self):
+        """Borrar el checkpoint (p. ej. al limpiar los datos sin detección en curso)"""
+        if self.state_path.exists():
+            self.state_path.unlink()
+        self._remove_stale_journals(keep=())
+
+    def start(self, detector_manager):
+        """Empezar a guardar checkpoints del DetectorManager en un hilo propio"""
+        if self.running:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._detector_manager = detector_manager
+        # Se reescribe todo desde el estado actual (ya restaurado si se reanudó)
+        self._generation = None
+        self.running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Detener el hilo y guardar un último checkpoint"""
+        if not self.running:
+            return
+        self.running = False
+        self._stop_event.set()
+        self.thread.join(timeout=5.0)
+        try:
+            self.save()
+        except Exception as e:
+            print(f"Error guardando checkpoint: {e}")
+
+    def _run(self):
+        # El primero se guarda de inmediato (p. ej. el estado recién reanudado) y luego cada `interval`
+        while True:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Error guardando checkpoint: {e}")
+            if self._stop_event.wait(self.interval):
+                break
+
+    def save(self):
+        """Escribir los registros nuevos en los diarios y reemplazar state.json"""
+        checkpoint = self._detector_manager.checkpoint_state
+        if checkpoint is None:
+            return
+        start = time.perf_counter()
+        snapshot, position = checkpoint
+
+        # Datos limpiados (o primer checkpoint): los diarios empiezan de cero en archivos nuevos,
+        # sin tocar los que referencia el state.json actual
+        if snapshot.generation != self._generation:
+            self._generation = snapshot.generation
+            self._journaled = {'history': None, 'trajectories': None}
+            token = uuid.uuid4().hex[:12]
+            self.journal_paths = {
+                journal: self.directory / f"{journal}-{token}.jsonl" for journal in self.journal_paths
+            }
+
+        history = self._append('history', snapshot.history)
+        trajectories = self._append('trajectories', snapshot.trajectories)
+
+        state = dict(
+            position,
+            format_version=FORMAT_VERSION,
+            saved_at=datetime.now().isoformat(),
+            snapshot_version=snapshot.version,
+            counts=snapshot.counts,
+            unique_ids=snapshot.unique_ids(),
+            history_entries=history[0],
+            history_bytes=history[1],
+            trajectories_entries=trajectories[0],
+            trajectories_bytes=trajectories[1],
+            history_file=self.journal_paths['history'].name,
+            trajectories_file=self.journal_paths['trajectories'].name
+        )
+        temporary = self.state_path.with_suffix(".json.tmp")
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f, default=_json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.state_path)
+        self._remove_stale_journals(keep=self.journal_paths.values())
+
+        self.checkpoints_written += 1
+        self.last_checkpoint_ms = (time.perf_counter() - start) * 1000.0
+
+    def _remove_stale_journals(self, keep):
+        """Borrar los diarios que ya no referencia state.json"""
+        keep = set(keep)
+        for pattern in ("history*.jsonl", "trajectories*.jsonl"):
+            for path in self.directory.glob(pattern):
+                if path not in keep:
+                    try:
+                        path.unlink()
+                    except OSError as e:
+                        print(f"No se pudo borrar el diario {path.name}: {e}")
+
+    def _append(self, journal, read_entries):
+        """Anexar al diario las entradas aún no escritas; devuelve (entradas, bytes) válidos"""
+        path = self.journal_paths[journal]
+        journaled = self._journaled[journal]
+        count, size = journaled or (0, 0)
+        new_entries = read_entries(count)
+        if journaled is not None and not new_entries:
+            return journaled
+
+        data = "".join(json.dumps(entry, default=_json_default) + "\n" for entry in new_entries).encode('utf-8')
+        with open(path, 'r+b' if journaled is not None else 'wb') as f:
+            # Descartar lo escrito tras el último checkpoint válido (p. ej. si falló a medias)
+            f.seek(size)
+            f.truncate()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._journaled[journal] = (count + len(new_entries), size + len(data))
+        return self._journaled[journal]
+
+    def get_stats(self):
+        return {
+            'directory': str(self.directory),
+            'checkpoints_written': self.checkpoints_written,
+            'last_checkpoint_ms': self.last_checkpoint_ms
+        }
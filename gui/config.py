@@ -0,0 +1,417 @@
+"""
+Configuración de sesión desde archivo YAML o TOML
+
+Define modelos, clases de vehículos, fuentes con sus ajustes de rendimiento
+y salidas. Se carga una vez al iniciar; los ajustes no estructurales
+(rendimiento por fuente, líneas de conteo, filtro de movimiento) se pueden
+recargar en caliente si el archivo cambia. Ver config.example.yaml.
+"""
+
+import copy
+import os
+import time
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:  # Dependencia opcional si solo se usa TOML
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+from .trackers import TRACKER_TYPES, tracker_parameters
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+DEFAULT_PERFORMANCE = {
+    'fps_limit': 30,  # Límite de FPS de visualización
+    'stride': 1,  # Procesar 1 de cada N frames
+    'imgsz': 640,  # Tamaño de entrada del modelo
+    'confianza': 0.25,  # Confianza mínima de detección
+    'backend': 'pytorch',  # Clave de 'modelos'
+    'hilos': None,  # Hilos de inferencia (None = automático)
+    'cola_exportacion': 64,  # Frames en cola del codificador de video
+    'fps_vista_previa': 5  # FPS de la vista previa MJPEG
+}
+
+DEFAULT_CONFIG = {
+    'modelos': {'pytorch': 'yolov8n.pt'},
+    'tracker': {'tipo': 'bytetrack', 'parametros': {}},  # También 'bytetrack.yaml' por compatibilidad
+    'clases_vehiculos': {
+        'car': 'Automóvil',
+        'bus': 'Autobús',
+        'truck': 'Camión',
+        'motorbike': 'Motocicleta',
+        'bicycle': 'Bicicleta',
+        'van': 'Camioneta'
+    },
+    'rendimiento': DEFAULT_PERFORMANCE,
+    'fuentes': [{'nombre': 'principal', 'fuente': '1.mp4'}],
+    'salidas': {
+        'reportes': 'reports',
+        'exportacion': None,
+        'servidor': None,
+        'metricas': None,  # {host, puerto} del endpoint /metrics
+        'checkpoints': None  # {directorio, intervalo_segundos, reanudar}
+    },
+    'recarga_segundos': 2.0
+}
+
+# Claves de 'filtro_movimiento' (además de 'activo') -> parámetros de MotionGate
+MOTION_GATE_OPTIONS = {
+    'ancho': 'width',
+    'umbral_pixel': 'pixel_threshold',
+    'proporcion_minima': 'min_changed_ratio',
+    'aprendizaje': 'learning_rate',
+    'max_saltos': 'max_skip',
+    'roi': 'roi'
+}
+
+# Ajustes de rendimiento que se pueden cambiar sin reiniciar la detección
+# (además de las líneas de conteo y el filtro de movimiento de cada fuente)
+HOT_RELOADABLE_PERFORMANCE = ('fps_limit', 'stride', 'imgsz', 'confianza', 'fps_vista_previa')
+
+class AppConfig:
+    """Configuración validada de la aplicación"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self._mtime = None
+        self._last_check = 0.0
+        self.data = self._load()
+
+    def _load(self):
+        """Leer, combinar con valores por defecto y validar"""
+        raw = {}
+        if self.path is not None:
+            self._mtime = os.path.getmtime(self.path)
+            raw = self._read_file(self.path) or {}
+
+        data = copy.deepcopy(DEFAULT_CONFIG)
+        for key, value in raw.items():
+            if key in ('salidas', 'rendimiento') and isinstance(value, dict):
+                data[key].update(value)
+            else:
+                data[key] = value
+        data['tracker'] = self._normalize_tracker(data['tracker'])
+
+        self._validate(data)
+        return data
+
+    def _read_file(self, path):
+        suffix = path.suffix.lower()
+        if suffix in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ImportError("Los archivos YAML requieren PyYAML: pip install pyyaml")
+            with open(path, 'r', encoding='utf-8') as f:
+                return yaml.safe_load(f)
+        if suffix == '.toml':
+            if tomllib is None:
+                raise ImportError("Los archivos TOML requieren Python 3.11 o superior")
+            with open(path, 'rb') as f:
+                return tomllib.load(f)
+        raise ValueError(f"Formato de configuración no soportado: {path.suffix}")
+
+    def _normalize_tracker(self, tracker):
+        """Aceptar 'bytetrack.yaml' (formato anterior) o {tipo, parametros}"""
+        if isinstance(tracker, str):
+            return {'tipo': Path(tracker).stem, 'parametros': {}}
+        if isinstance(tracker, dict):
+            return dict({'tipo': 'bytetrack', 'parametros': {}}, **tracker)
+        return tracker
+
+    def _validate(self, data):
+        """Validar la configuración completa; reúne todos los errores antes de fallar"""
+        errors = []
+
+        known = set(DEFAULT_CONFIG)
+        for key in data:
+            if key not in known:
+                errors.append(f"clave desconocida '{key}'")
+
+        if not isinstance(data['modelos'], dict) or not data['modelos']:
+            errors.append("'modelos' debe ser un mapa backend -> ruta del modelo")
+        else:
+            for backend in data['modelos']:
+                if backend not in BACKENDS:
+                    errors.append(f"backend desconocido en 'modelos': {backend} (opciones: {', '.join(BACKENDS)})")
+
+        if not isinstance(data['clases_vehiculos'], dict) or not data['clases_vehiculos']:
+            errors.append("'clases_vehiculos' debe ser un mapa clase YOLO -> nombre a mostrar")
+
+        errors.extend(self._validate_tracker(data['tracker'], 'tracker'))
+
+        performance_ok = isinstance(data['rendimiento'], dict)
+        if performance_ok:
+            errors.extend(self._validate_performance(data['rendimiento'], 'rendimiento', data['modelos']))
+        else:
+            errors.append("'rendimiento' debe ser un mapa de ajustes")
+
+        sources = data['fuentes']
+        if not isinstance(sources, list) or not sources:
+            errors.append("'fuentes' debe ser una lista con al menos una fuente")
+            sources = []
+        names = set()
+        for index, source in enumerate(sources):
+            where = f"fuentes[{index}]"
+            if not isinstance(source, dict) or 'fuente' not in source:
+                errors.append(f"{where}: falta 'fuente'")
+                continue
+            name = source.setdefault('nombre', str(source['fuente']))
+            if name in names:
+                errors.append(f"{where}: nombre de fuente repetido '{name}'")
+            names.add(name)
+            for key in source:
+                if key not in ('nombre', 'fuente', 'rendimiento', 'tracker', 'lineas_conteo', 'calibracion',
+                               'filtro_movimiento'):
+                    errors.append(f"{where}: clave desconocida '{key}'")
+            source_performance = source.get('rendimiento') or {}
+            if not isinstance(source_performance, dict):
+                errors.append(f"{where}.rendimiento debe ser un mapa de ajustes")
+            elif performance_ok:
+                performance = dict(data['rendimiento'], **source_performance)
+                errors.extend(self._validate_performance(performance, f"{where}.rendimiento", data['modelos']))
+            errors.extend(self._validate_lines(source.get('lineas_conteo', []), where))
+            errors.extend(self._validate_motion_filter(source.get('filtro_movimiento'), where))
+            if source.get('tracker') is not None:
+                errors.extend(self._validate_tracker(self._source_tracker(data['tracker'], source), f"{where}.tracker"))
+            calibration = source.get('calibracion')
+            if calibration is not None and not isinstance(calibration, dict):
+                errors.append(f"{where}.calibracion debe ser un mapa {{puntos_imagen, puntos_mundo}}")
+            elif calibration is not None:
+                image_points = calibration.get('puntos_imagen', [])
+                world_points = calibration.get('puntos_mundo', [])
+                if not self._is_point_list(image_points) or not self._is_point_list(world_points):
+                    errors.append(f"{where}.calibracion: puntos_imagen y puntos_mundo deben ser listas [[x, y], ...]")
+                elif len(image_points) < 4 or len(image_points) != len(world_points):
+                    errors.append(f"{where}.calibracion: se requieren 4+ pares puntos_imagen/puntos_mundo")
+
+        if not isinstance(data['recarga_segundos'], (int, float)) or data['recarga_segundos'] <= 0:
+            errors.append("'recarga_segundos' debe ser un número positivo")
+
+        errors.extend(self._validate_outputs(data['salidas']))
+
+        if errors:
+            origin = f" ({self.path})" if self.path else ""
+            raise ValueError(f"Configuración inválida{origin}:\n- " + "\n- ".join(errors))
+
+    def _validate_performance(self, performance, where, models):
+        errors = []
+        for key in performance:
+            if key not in DEFAULT_PERFORMANCE:
+                errors.append(f"{where}: clave desconocida '{key}'")
+
+        def positive_int(key):
+            value = performance.get(key)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                errors.append(f"{where}.{key} debe ser un entero positivo")
+
+        for key in ('fps_limit', 'stride', 'imgsz', 'cola_exportacion', 'fps_vista_previa'):
+            positive_int(key)
+        if isinstance(performance.get('imgsz'), int) and performance['imgsz'] % 32:
+            errors.append(f"{where}.imgsz debe ser múltiplo de 32")
+        confidence = performance.get('confianza')
+        if not isinstance(confidence, (int, float)) or not 0 < confidence < 1:
+            errors.append(f"{where}.confianza debe estar entre 0 y 1")
+        if performance.get('hilos') is not None:
+            positive_int('hilos')
+        if performance.get('backend') not in (models or {}):
+            errors.append(f"{where}.backend '{performance.get('backend')}' no está definido en 'modelos'")
+        return errors
+
+    def _validate_outputs(self, outputs):
+        if not isinstance(outputs, dict):
+            return ["'salidas' debe ser un mapa de salidas"]
+        errors = []
+        for key in outputs:
+            if key not in DEFAULT_CONFIG['salidas']:
+                errors.append(f"salidas: clave desconocida '{key}'")
+        if not isinstance(outputs.get('reportes'), str) or not outputs.get('reportes'):
+            errors.append("salidas.reportes debe ser la ruta del directorio de reportes")
+        # Cada salida es opcional (null), pero si se define debe ser un mapa con sus claves obligatorias
+        for key, required in (('exportacion', 'ruta'), ('servidor', None), ('metricas', None),
+                              ('checkpoints', 'directorio')):
+            settings = outputs.get(key)
+            if settings is None:
+                continue
+            if not isinstance(settings, dict):
+                errors.append(f"salidas.{key} debe ser un mapa o null")
+            elif required is not None and not settings.get(required):
+                errors.append(f"salidas.{key}: falta '{required}'")
+        return errors
+
+    def _validate_tracker(self, tracker, where):
+        if not isinstance(tracker, dict):
+            return [f"'{where}' debe ser un nombre de tracker o un mapa {{tipo, parametros}}"]
+        errors = []
+        for key in tracker:
+            if key not in ('tipo', 'parametros'):
+                errors.append(f"{where}: clave desconocida '{key}'")
+        if tracker.get('tipo') not in TRACKER_TYPES:
+            errors.append(f"{where}.tipo debe ser uno de: {', '.join(TRACKER_TYPES)}")
+        if not isinstance(tracker.get('parametros'), dict):
+            errors.append(f"{where}.parametros debe ser un mapa")
+        elif tracker.get('tipo') in TRACKER_TYPES:
+            valid = tracker_parameters(tracker['tipo'])
+            for key in tracker['parametros']:
+                if valid is not None and key not in valid:
+                    errors.append(f"{where}.parametros: '{key}' no es un parámetro de {tracker['tipo']} "
+                                  f"(opciones: {', '.join(sorted(valid))})")
+        return errors
+
+    def _source_tracker(self, tracker, source):
+        """Tracker global con el tipo y los parámetros propios de la fuente encima"""
+        override = source.get('tracker') or {}
+        if isinstance(override, str):
+            override = {'tipo': Path(override).stem}
+        if not isinstance(override, dict) or not isinstance(tracker, dict):
+            return override
+        merged = dict(tracker, **override)
+        if merged.get('tipo') == tracker.get('tipo'):
+            merged['parametros'] = dict(tracker.get('parametros') or {}, **(override.get('parametros') or {}))
+        else:
+            merged['parametros'] = override.get('parametros') or {}
+        return merged
+
+    def _validate_motion_filter(self, settings, where):
+        if settings is None:
+            return []
+        where = f"{where}.filtro_movimiento"
+        if not isinstance(settings, dict):
+            return [f"{where} debe ser un mapa (activo, {', '.join(MOTION_GATE_OPTIONS)})"]
+        errors = []
+
+        def number(key, minimum, maximum=None, integer=False):
+            value = settings.get(key)
+            if value is None:
+                return
+            kinds = int if integer else (int, float)
+            if (not isinstance(value, kinds) or isinstance(value, bool) or value < minimum
+                    or (maximum is not None and value > maximum)):
+                limits = f"entre {minimum} y {maximum}" if maximum is not None else f"mayor o igual a {minimum}"
+                errors.append(f"{where}.{key} debe ser {'un entero' if integer else 'un número'} {limits}")
+
+        for key in settings:
+            if key != 'activo' and key not in MOTION_GATE_OPTIONS:
+                errors.append(f"{where}: clave desconocida '{key}'")
+        if not isinstance(settings.get('activo', True), bool):
+            errors.append(f"{where}.activo debe ser true o false")
+        number('ancho', 1, integer=True)
+        number('umbral_pixel', 0, 255)
+        number('proporcion_minima', 0, 1)
+        number('aprendizaje', 0, 1)
+        number('max_saltos', 0, integer=True)
+        roi = settings.get('roi')
+        if roi is not None:
+            try:
+                if len(roi) < 3:
+                    raise ValueError
+                for x, y in roi:
+                    float(x), float(y)
+            except (TypeError, ValueError):
+                errors.append(f"{where}.roi debe ser un polígono de 3+ puntos [[x, y], ...]")
+        return errors
+
+    def _is_point_list(self, points):
+        """Lista de puntos [[x, y], ...] con coordenadas numéricas"""
+        if not isinstance(points, list):
+            return False
+        try:
+            for x, y in points:
+                float(x), float(y)
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def _validate_lines(self, lines, where):
+        errors = []
+        for index, line in enumerate(lines or []):
+            try:
+                (x1, y1), (x2, y2) = line
+                float(x1), float(y1), float(x2), float(y2)
+            except (TypeError, ValueError):
+                errors.append(f"{where}.lineas_conteo[{index}] debe ser [[x1, y1], [x2, y2]]")
+        return errors
+
+    # Acceso
+
+    @property
+    def source_names(self):
+        return [source['nombre'] for source in self.data['fuentes']]
+
+    def source(self, name=None):
+        """Ajustes de una fuente (la primera si no se indica) con el rendimiento ya combinado"""
+        return self._source_settings(self.data, name)
+
+    def _source_settings(self, data, name):
+        sources = data['fuentes']
+        if name is None:
+            source = sources[0]
+        else:
+            matches = [s for s in sources if s['nombre'] == name]
+            if not matches:
+                raise ValueError(f"Fuente no definida en la configuración: {name}")
+            source = matches[0]
+
+        settings = copy.deepcopy(source)
+        settings['rendimiento'] = dict(data['rendimiento'], **(source.get('rendimiento') or {}))
+        settings['tracker'] = self._source_tracker(data['tracker'], source)
+        settings.setdefault('lineas_conteo', [])
+        settings.setdefault('calibracion', None)
+        settings.setdefault('filtro_movimiento', None)
+        return settings
+
+    def model_path(self, backend):
+        return self.data['modelos'][backend]
+
+    @property
+    def vehicle_classes(self):
+        return dict(self.data['clases_vehiculos'])
+
+    @property
+    def outputs(self):
+        return self.data['salidas']
+
+    # Recarga en caliente
+
+    def check_reload(self, source_name=None):
+        """Recargar si el archivo cambió; devuelve (ajustes de la fuente, cambios estructurales ignorados)
+
+        Devuelve None si no hubo cambios. Una configuración inválida se reporta y se conserva la anterior.
+        """
+        now = time.monotonic()
+        if self.path is None or now - self._last_check < self.data['recarga_segundos']:
+            return None
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return None
+            previous = self.source(source_name)
+            previous_data = self.data
+            # Se adopta solo si también define la fuente en curso
+            data = self._load()
+            current = self._source_settings(data, source_name)
+            self.data = data
+        except Exception as e:
+            print(f"Configuración no recargada: {e}")
+            self._mtime = os.path.getmtime(self.path) if self.path.exists() else self._mtime
+            return None
+
+        structural = [
+            key for key in ('modelos', 'clases_vehiculos', 'salidas')
+            if previous_data[key] != self.data[key]
+        ]
+        if previous['tracker'] != current['tracker']:
+            structural.append('tracker')
+        if previous['fuente'] != current['fuente'] or previous['calibracion'] != current['calibracion']:
+            structural.append(f"fuentes.{current['nombre']}")
+        for key in previous['rendimiento']:
+            if key not in HOT_RELOADABLE_PERFORMANCE and previous['rendimiento'][key] != current['rendimiento'][key]:
+                structural.append(f"rendimiento.{key}")
+
+        return current, structural
@@ -0,0 +1,117 @@
+import threading
+
+class CounterSnapshot:
+    """Vista inmutable y consistente de los contadores en un instante
+
+    Comparte las listas de solo-anexado del almacén y guarda su longitud al
+    publicarse: lo que se anexe después no es visible, y nada se copia.
+    """
+
+    __slots__ = ('version', 'generation', 'counts', 'tracked_count', '_history', '_history_length',
+                 '_trajectories', '_trajectories_length', '_ids', '_id_lengths')
+
+    def __init__(self, version, generation, counts, tracked_count, history, trajectories, ids):
+        self.version = version
+        self.generation = generation  # Cambia al limpiar o restaurar los datos
+        self.counts = counts  # {class_name: vehículos únicos}; no se modifica tras publicarse
+        self.tracked_count = tracked_count
+        self._history = history
+        self._history_length = len(history)
+        self._trajectories = trajectories
+        self._trajectories_length = len(trajectories)
+        self._ids = ids
+        self._id_lengths = {class_name: len(track_ids) for class_name, track_ids in ids.items()}
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @property
+    def history_length(self):
+        return self._history_length
+
+    def history(self, start=0):
+        """Historial visible en este snapshot como lista nueva (desde la posición start)"""
+        return self._history[start:self._history_length]
+
+    def trajectories(self, start=0):
+        """Resúmenes de trayectorias terminadas visibles en este snapshot"""
+        return self._trajectories[start:self._trajectories_length]
+
+    def unique_ids(self):
+        """IDs únicos por clase visibles en este snapshot"""
+        return {class_name: self._ids[class_name][:length] for class_name, length in self._id_lengths.items()}
+
+class CounterStore:
+    """Estado de conteo con un escritor y lectores sin bloqueo
+
+    El hilo de detección escribe y publica un CounterSnapshot nuevo por cada
+    cambio; la publicación es una sola asignación de atributo, de modo que la
+    UI, los reportes y los servicios leen vistas consistentes sin tomar locks.
+    El lock solo serializa escritores (p. ej. limpiar datos desde la UI).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._generation = 0
+        self._reset_state()
+
+    def _reset_state(self):
+        # Listas nuevas: los snapshots anteriores conservan las suyas intactas
+        self._generation += 1
+        self._history = []
+        self._trajectories = []
+        self._ids = {}
+        self._tracked = set()
+        self._publish({})
+
+    def _publish(self, counts):
+        self._version += 1
+        self._snapshot = CounterSnapshot(
+            self._version, self._generation, counts, len(self._tracked), self._history, self._trajectories, self._ids
+        )
+
+    def snapshot(self):
+        """Último snapshot publicado (lectura sin bloqueo)"""
+        return self._snapshot
+
+    def is_counted(self, track_id):
+        """Indica si un track ya fue contado"""
+        return track_id in self._tracked
+
+    def add_vehicle(self, track_id, class_name, entry):
+        """Contar un vehículo una sola vez y anexar su registro al historial"""
+        with self._lock:
+            if track_id in self._tracked:
+                return False
+            self._tracked.add(track_id)
+            self._ids.setdefault(class_name, []).append(track_id)
+            self._history.append(entry)
+
+            counts = dict(self._snapshot.counts)
+            counts[class_name] = counts.get(class_name, 0) + 1
+            self._publish(counts)
+            return True
+
+    def add_trajectory(self, summary):
+        """Anexar el resumen de una trayectoria terminada"""
+        with self._lock:
+            self._trajectories.append(summary)
+            self._publish(self._snapshot.counts)
+
+    def clear(self):
+        """Descartar todos los conteos"""
+        with self._lock:
+            self._reset_state()
+
+    def restore(self, history, trajectories, unique_ids):
+        """Reemplazar el estado por uno guardado (p. ej. un checkpoint) y publicarlo"""
+        with self._lock:
+            self._reset_state()
+            self._history.extend(history)
+            self._trajectories.extend(trajectories)
+            for class_name, track_ids in unique_ids.items():
+                self._ids[class_name] = list(track_ids)
+                self._tracked.update(track_ids)
+            self._publish({class_name: len(track_ids) for class_name, track_ids in self._ids.items()})
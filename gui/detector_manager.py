@@ -1,60 +1,380 @@
 import cv2
+import json
+import os
 import threading
 import time
+import numpy as np
 from datetime import datetime
 from ultralytics import YOLO
-from collections import defaultdict
+from collections import deque
+from .frame_renderer import FrameRenderer
+from .video_exporter import VideoExporter
+from .track_store import TrackStore
+from .live_server import LiveServer
+from .counter_store import CounterStore
+from .motion_gate import MotionGate
+from .config import AppConfig, MOTION_GATE_OPTIONS
+from .metrics import PipelineMetrics, MetricsServer
+from .trackers import box_iou, create_tracker
+from .checkpoint import Checkpointer
 
 class DetectorManager:
-    def __init__(self, main_window):
+    def __init__(self, main_window=None, model_path=None, config=None, source_name=None):
         self.main_window = main_window
-        self.model = YOLO("yolov8n.pt")
+        self.headless = main_window is None  # Sin ventana: no se renderiza nada
+        
+        # Configuración de sesión (valores por defecto si no se indica archivo)
+        self.config = config or AppConfig()
+        self.source_settings = self.config.source(source_name)
+        performance = self.source_settings['rendimiento']
+        self._set_inference_threads(performance['hilos'])
+        
+        # Acepta .pt (FP32) o modelos exportados/cuantizados (.onnx, directorio OpenVINO)
+        self.fixed_model_path = model_path  # Si se indica, ignora el backend de cada fuente
+        self.model_path = model_path or self.config.model_path(performance['backend'])
+        self.model = YOLO(self.model_path, task="detect")
         
         # Estado de detección
         self.detecting = False
         self.cap = None
         self.detection_thread = None
         
-        # Datos de detección - CORREGIDO
-        self.vehicle_counters = defaultdict(set)  # Para tracking único
-        self.detection_history = []  # Historial de detecciones
-        self.tracked_vehicles = set()  # NUEVO: Set para rastrear vehículos ya procesados
+        # Datos de detección: el hilo de detección escribe y publica snapshots inmutables
+        self.counter_store = CounterStore()  # Conteo único, historial y trayectorias
         self.first_detection_time = {}  # NUEVO: Tiempo de primera detección por track_id
-        self.video_source = "1.mp4"  # Fuente por defecto
+        self._reset_requested = False  # Limpieza pendiente del estado propio del hilo de detección
+        self._ui_pending = False  # Hay un frame entregado a Tk que aún no se mostró
+        self.video_source = self.source_settings['fuente']
         
-        # FPS control para suavizar la visualización
-        self.fps_limit = 30
+        # Rendimiento (ver _apply_source_settings)
+        self.fps_limit = 30  # FPS control para suavizar la visualización
         self.frame_delay = 1.0 / self.fps_limit
+        self.frame_stride = 1  # Procesar 1 de cada N frames
+        self.imgsz = 640
+        self.confidence = 0.25
+        self.frame_index = 0  # Posición en la fuente (frames leídos, incluidos los saltados)
         
         # Configuración de clases de vehículos
-        self.vehicle_classes = {
-            'car': 'Automóvil',
-            'bus': 'Autobús', 
-            'truck': 'Camión',
-            'motorbike': 'Motocicleta',
-            'bicycle': 'Bicicleta',
-            'van': 'Camioneta'
+        self.vehicle_classes = self.config.vehicle_classes
+        self.vehicle_class_ids = np.array(
+            [class_id for class_id, name in self.model.names.items() if name in self.vehicle_classes],
+            dtype=np.int64
+        )
+        
+        # Índice compacto de clase de vehículo para la votación por track
+        self.class_order = list(self.vehicle_classes)
+        self.class_index_lut = np.full(max(self.model.names) + 1, -1, dtype=np.int64)
+        for class_id in self.vehicle_class_ids.tolist():
+            self.class_index_lut[class_id] = self.class_order.index(self.model.names[class_id])
+        
+        # Renderizado ligero de anotaciones
+        self.counting_lines = []  # Líneas de conteo [((x1, y1), (x2, y2)), ...] en coordenadas de la fuente
+        self.renderer = FrameRenderer(self.vehicle_classes)
+        
+        # Instrumentación: tiempos por etapa en ms (ventana móvil)
+        self.stage_times = {
+            'inference': deque(maxlen=100),
+            'tracking': deque(maxlen=100),
+            'render': deque(maxlen=100)
         }
         
+        # Tracker desacoplado del modelo (ByteTrack, BoT-SORT o IoU según la fuente)
+        self.tracker = None
+        self.max_track_id = 0  # Mayor ID entregado en el proceso (o en la sesión reanudada)
+        self.track_id_offset = 0  # Se suma a los IDs del tracker para no repetir IDs ya contados
+        self._last_tracks = (np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float32))  # IDs y cajas del último frame
+        self._resumed_tracks = None  # (IDs, cajas) en escena al guardar el checkpoint reanudado
+        self._resume_frames = 0  # Frames con inferencia desde la reanudación
+        self._resume_aliases = {}  # ID nuevo del tracker -> ID del checkpoint
+        
+        # Trayectorias por track (buffers circulares acotados por tracks activos)
+        self.track_store = TrackStore(num_classes=len(self.class_order))
+        self.calibrations = {}  # fuente -> homografía 3x3 píxel -> metros
+        self.frame_timestamp = 0.0  # Segundos del frame actual (tiempo de video en archivos)
+        self.is_file_source = False
+        self._timestamp_offset = 0.0  # Acumulado de reproducciones anteriores al reiniciar un archivo
+        
+        # Exportación de video anotado (opcional)
+        self.export_options = None  # Parámetros de VideoExporter; None = sin exportación
+        self.video_exporter = None
+        
+        # Servidor HTTP/WebSocket en vivo (opcional)
+        self.live_server = None
+        
+        # Filtro de movimiento previo a la inferencia (opcional)
+        self.motion_gate = None
+        self._motion_gate_settings = None
+        
+        # Métricas para monitoreo (se actualizan siempre; el endpoint HTTP es opcional)
+        self.metrics = PipelineMetrics(self)
+        self.metrics_server = None
+        
+        # Checkpoints periódicos para reanudar tras una caída (opcional)
+        self.checkpointer = None
+        self.resume_checkpoint = True
+        self.checkpoint_state = None  # (snapshot, posición) del último frame procesado
+        
+        self._apply_source_settings(self.source_settings)
+        self._create_tracker()
+        self.configurar_exportacion_config()
+        checkpoint_settings = self.config.outputs['checkpoints']
+        if checkpoint_settings:
+            self.configurar_checkpoints(
+                checkpoint_settings['directorio'],
+                checkpoint_settings.get('intervalo_segundos', 5.0),
+                checkpoint_settings.get('reanudar', True)
+            )
+        
+    def _set_inference_threads(self, threads):
+        """Limitar los hilos de inferencia (None = automático)"""
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+            cv2.setNumThreads(threads)
+            
+    def _apply_source_settings(self, settings):
+        """Aplicar rendimiento, líneas de conteo, calibración y filtro de movimiento de una fuente
+        
+        También se usa al recargar la configuración en caliente.
+        """
+        performance = settings['rendimiento']
+        self.fps_limit = performance['fps_limit']
+        self.frame_delay = 1.0 / self.fps_limit
+        self.frame_stride = performance['stride']
+        self.imgsz = performance['imgsz']
+        self.confidence = performance['confianza']
+        if self.live_server:
+            self.live_server.preview_interval = 1.0 / performance['fps_vista_previa']
+            
+        self.set_counting_lines(settings['lineas_conteo'])
+        
+        calibration = settings['calibracion']
+        if calibration:
+            self.set_calibration(calibration['puntos_imagen'], calibration['puntos_mundo'], settings['fuente'])
+            
+        # Reconstruir el filtro solo si cambió, para no perder el fondo aprendido
+        motion_settings = settings['filtro_movimiento']
+        if motion_settings != self._motion_gate_settings:
+            self._motion_gate_settings = motion_settings
+            motion_settings = dict(motion_settings or {})
+            enabled = motion_settings.pop('activo', bool(motion_settings))
+            options = {MOTION_GATE_OPTIONS[key]: value for key, value in motion_settings.items()}
+            self.configurar_filtro_movimiento(enabled, **options)
+            
+    def seleccionar_fuente(self, name):
+        """Usar una fuente definida en la configuración por su nombre"""
+        if self.detecting:
+            raise Exception("No se puede cambiar de fuente durante la detección")
+        previous = self.source_settings['rendimiento']
+        self.source_settings = self.config.source(name)
+        performance = self.source_settings['rendimiento']
+        
+        # Backend, hilos y cola de exportación no se recargan en caliente: se aplican al cambiar de fuente
+        if performance['hilos'] != previous['hilos']:
+            self._set_inference_threads(performance['hilos'])
+        model_path = self.fixed_model_path or self.config.model_path(performance['backend'])
+        if model_path != self.model_path:
+            self.model_path = model_path
+            self.model = YOLO(self.model_path, task="detect")
+        if self.export_options and self.export_options['queue_size'] == previous['cola_exportacion']:
+            self.export_options['queue_size'] = performance['cola_exportacion']
+            
+        self.set_video_source(self.source_settings['fuente'])
+        self._apply_source_settings(self.source_settings)
+        self._create_tracker()
+        
+    def _create_tracker(self, frame_rate=30):
+        """Crear el tracker de la fuente actual; frame_rate ajusta cuántos frames se conserva un track perdido"""
+        tracker_settings = self.source_settings['tracker']
+        self.tracker = create_tracker(tracker_settings['tipo'], tracker_settings['parametros'], frame_rate)
+        self.track_id_offset = self.max_track_id
+        # Cerrar trayectorias cuando el tracker olvida el ID: antes, un ID que vuelve ocuparía otro slot
+        self.track_store.max_missed_frames = self.tracker.lost_track_frames
+        
+    def _tracker_frame_rate(self, cap):
+        """Frames por segundo que realmente recibe el tracker (FPS de la fuente entre el stride)"""
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or self.fps_limit
+        return max(1, int(round(source_fps / self.frame_stride)))
+        
+    def _export_options(self, export_settings):
+        """Traducir 'salidas.exportacion' de la configuración a parámetros de VideoExporter"""
+        options = {'output_path': export_settings['ruta']}
+        keys = {
+            'codec': 'codec',
+            'bitrate': 'bitrate',
+            'resolucion': 'output_size',
+            'solo_eventos': 'events_only',
+            'segundos_previos': 'pre_event_seconds',
+            'segundos_posteriores': 'post_event_seconds'
+        }
+        for key, option in keys.items():
+            if export_settings.get(key) is not None:
+                options[option] = export_settings[key]
+        if 'output_size' in options:
+            options['output_size'] = tuple(options['output_size'])
+        return options
+        
     def set_video_source(self, source):
         """Establecer fuente de video"""
         self.video_source = source
         
+    def set_calibration(self, image_points, world_points, source=None):
+        """Calibrar una fuente con 4+ pares de puntos imagen (px) -> suelo (metros)"""
+        image_points = np.asarray(image_points, dtype=np.float32)
+        world_points = np.asarray(world_points, dtype=np.float32)
+        if len(image_points) < 4 or len(image_points) != len(world_points):
+            raise ValueError("La calibración requiere al menos 4 pares de puntos imagen/mundo")
+            
+        homography, _ = cv2.findHomography(image_points, world_points)
+        if homography is None:
+            raise ValueError("No se pudo calcular la homografía con los puntos indicados")
+            
+        self.calibrations[source if source is not None else self.video_source] = homography
+        return homography
+        
+    def _calibration_for(self, source):
+        """Homografía de una fuente; las rutas de archivo se comparan resueltas (relativas o absolutas)"""
+        if source in self.calibrations:
+            return self.calibrations[source]
+        if isinstance(source, str) and os.path.exists(source):
+            resolved = os.path.realpath(source)
+            for key, homography in self.calibrations.items():
+                if isinstance(key, str) and os.path.exists(key) and os.path.realpath(key) == resolved:
+                    return homography
+        return None
+        
+    def set_counting_lines(self, lines):
+        """Definir líneas de conteo [((x1, y1), (x2, y2)), ...] en píxeles de la fuente"""
+        self.counting_lines = [tuple(map(tuple, line)) for line in lines]
+        
+    def cargar_calibraciones(self, path):
+        """Cargar calibraciones desde JSON: {fuente: {"puntos_imagen": [...], "puntos_mundo": [...]}}"""
+        with open(path, 'r', encoding='utf-8') as f:
+            calibrations = json.load(f)
+            
+        for source, points in calibrations.items():
+            self.set_calibration(points['puntos_imagen'], points['puntos_mundo'], source)
+        
+    def configurar_exportacion(self, output_path=None, **options):
+        """Activar la exportación del video anotado (output_path=None la desactiva)
+        
+        Opciones: codec, bitrate, output_size, queue_size, events_only,
+        pre_event_seconds, post_event_seconds (ver VideoExporter)
+        """
+        options.setdefault('queue_size', self.source_settings['rendimiento']['cola_exportacion'])
+        self.export_options = dict(options, output_path=output_path) if output_path else None
+        
+    def configurar_exportacion_config(self, output_path=None, events_only=None):
+        """Exportación de 'salidas.exportacion' con la ruta y el modo elegidos en la interfaz encima
+        
+        Sin ruta elegida ni exportación en la configuración, la exportación queda desactivada.
+        """
+        export_settings = self.config.outputs['exportacion']
+        options = self._export_options(export_settings) if export_settings else {}
+        if output_path:
+            options['output_path'] = output_path
+        if events_only is not None:
+            options['events_only'] = events_only
+        self.configurar_exportacion(**options)
+        
+    def configurar_checkpoints(self, directory=None, interval=5.0, resume=True):
+        """Guardar checkpoints cada `interval` segundos en `directory` (None los desactiva)
+        
+        Con resume=True, al iniciar la detección se reanuda el último checkpoint de la misma fuente.
+        """
+        self.checkpointer = Checkpointer(directory, interval) if directory else None
+        self.resume_checkpoint = resume
+        
+    def configurar_filtro_movimiento(self, enabled=True, **options):
+        """Activar el filtro de movimiento que salta la inferencia en frames estáticos
+        
+        Opciones: width, pixel_threshold, min_changed_ratio, learning_rate, max_skip, roi (ver MotionGate)
+        """
+        self.motion_gate = MotionGate(**options) if enabled else None
+        
+    def iniciar_servidor(self, **options):
+        """Iniciar el servidor en vivo (REST, WebSocket y vista previa MJPEG)
+        
+        Opciones: host, port, preview_fps, preview_size, jpeg_quality, push_interval (ver LiveServer)
+        """
+        if self.live_server is None:
+            options.setdefault('preview_fps', self.source_settings['rendimiento']['fps_vista_previa'])
+            # Solo se registra si inició: un puerto ocupado lanza la excepción aquí
+            live_server = LiveServer(self, **options)
+            live_server.start()
+            self.live_server = live_server
+        return self.live_server
+        
+    def detener_servidor(self):
+        """Detener el servidor en vivo"""
+        # Se quita antes de detenerlo para que el hilo de detección no publique en un loop cerrado
+        live_server, self.live_server = self.live_server, None
+        if live_server:
+            live_server.stop()
+            
+    def iniciar_metricas(self, host="127.0.0.1", port=9100):
+        """Exponer las métricas del pipeline en http://host:port/metrics (formato Prometheus)"""
+        if self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.metrics, host, port)
+            self.metrics_server.start()
+        return self.metrics_server
+        
+    def detener_metricas(self):
+        """Detener el endpoint de métricas"""
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        
     def iniciar_deteccion(self):
         """Iniciar proceso de detección"""
         if self.detecting:
             return
+        if self.detection_thread and self.detection_thread.is_alive():
+            raise Exception("La detección anterior aún está terminando")
             
+        resume_state = None
+        if self.checkpointer and self.resume_checkpoint:
+            resume_state = self.checkpointer.load(self.video_source)
+            
+        # El checkpoint en disco se conserva hasta que el primero de esta sesión lo reemplace;
+        # el hilo aún no corre, así que el estado de tracking se limpia aquí mismo
+        self.clear_data(discard_checkpoint=False)
         self.detecting = True
-        self.clear_data()
         
         # Inicializar captura de video
         self.cap = cv2.VideoCapture(self.video_source)
         if not self.cap.isOpened():
+            self.detecting = False
+            self.cap.release()
+            self.cap = None
             raise Exception(f"No se pudo abrir el video: {self.video_source}")
             
         # Configurar captura
         self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.is_file_source = isinstance(self.video_source, str) and os.path.isfile(self.video_source)
+        self._timestamp_offset = 0.0
+        self.frame_index = 0
+        self._ui_pending = False
+        self.checkpoint_state = None
+        if resume_state:
+            self._restore_checkpoint(resume_state)
+        self._create_tracker(self._tracker_frame_rate(self.cap))
+        
+        # Calibración de velocidad de esta fuente (si existe)
+        self.track_store.set_homography(self._calibration_for(self.video_source))
+        
+        if self.checkpointer:
+            self._publish_checkpoint_state()
+            self.checkpointer.start(self)
+        
+        # Iniciar codificador de video en su propio hilo
+        if self.export_options:
+            options = dict(self.export_options)
+            # Se escribe 1 de cada `stride` frames; en archivos cada uno cubre stride/fps segundos del video
+            source_fps = (self.cap.get(cv2.CAP_PROP_FPS) or self.fps_limit) / self.frame_stride
+            options.setdefault('fps', source_fps if self.is_file_source else min(source_fps, self.fps_limit))
+            self.video_exporter = VideoExporter(**options)
+            self.video_exporter.start()
         
         # Iniciar hilo de detección
         self.detection_thread = threading.Thread(target=self._process_video, daemon=True)
@@ -64,23 +384,143 @@ class DetectorManager:
         """Detener proceso de detección"""
         self.detecting = False
         
+        # El hilo de detección cierra la sesión al salir (ver _finish_session)
+        if self.detection_thread and self.detection_thread.is_alive():
+            self.detection_thread.join(timeout=5.0)
+            if self.detection_thread.is_alive():
+                print("La detección terminará en segundo plano al completar el frame en curso")
+                
+    def _finish_session(self):
+        """Cerrar tracks, checkpoint, exportación y captura; solo desde el hilo de detección al salir"""
+        # Cerrar los tracks que seguían activos y asentar su clase
+        self._finish_tracks(self.track_store.flush())
+        
+        # Último checkpoint con los tracks ya asentados
+        if self.checkpointer:
+            self._publish_checkpoint_state()
+            self.checkpointer.stop()
+            
+        if self.video_exporter:
+            self.video_exporter.stop()
+            self.video_exporter = None
+            
         if self.cap:
             self.cap.release()
             self.cap = None
             
-        if self.detection_thread and self.detection_thread.is_alive():
-            self.detection_thread.join(timeout=1.0)
+    def _restore_checkpoint(self, state):
+        """Restaurar conteos y posición de un checkpoint (la captura ya debe estar abierta)"""
+        self.counter_store.restore(state['history'], state['trajectories'], state['unique_ids'])
+        
+        # Los IDs nuevos continúan después de los ya contados
+        self.max_track_id = max(self.max_track_id, state['max_track_id'])
+        
+        # Vehículos en escena al guardar: al reaparecer recuperan su ID (y con él si ya se contaron)
+        self._resumed_tracks = (
+            np.asarray(state.get('active_track_ids', []), dtype=np.int64),
+            np.asarray(state.get('active_track_boxes', []), dtype=np.float32).reshape(-1, 4)
+        )
+        self._resume_frames = 0
+        
+        # Un archivo sigue desde el último frame procesado; una fuente en vivo solo conserva los conteos
+        if self.is_file_source and state['is_file_source']:
+            self.frame_index = state['frame_index']
+            self.frame_timestamp = state['frame_timestamp']
+            self._timestamp_offset = state['timestamp_offset']
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_index)
+            
+        print(f"Sesión reanudada desde el checkpoint del {state['saved_at']}: "
+              f"{sum(state['counts'].values())} vehículos, frame {state['frame_index']}")
+        
+    def _publish_checkpoint_state(self):
+        """Publicar snapshot y posición juntos para que el checkpoint sea consistente (una asignación)"""
+        self.checkpoint_state = (self.counter_store.snapshot(), {
+            'source': str(self.video_source),
+            'is_file_source': self.is_file_source,
+            'frame_index': self.frame_index,
+            'frame_timestamp': self.frame_timestamp,
+            'timestamp_offset': self._timestamp_offset,
+            'max_track_id': self.max_track_id,
+            'active_track_ids': self._last_tracks[0],
+            'active_track_boxes': self._last_tracks[1]
+        })
+        
+    def procesar_archivo(self, video_path, progress_callback=None, progress_interval=100):
+        """Procesar un archivo completo de forma síncrona, sin límite de FPS ni reinicio al final
+        
+        progress_callback(frames_procesados, frames_totales) se llama cada progress_interval frames.
+        Devuelve los datos del reporte (ver get_detection_data).
+        """
+        if self.detecting:
+            raise Exception("Hay una detección en curso")
+            
+        self.set_video_source(video_path)
+        self.clear_data(discard_checkpoint=False)  # El checkpoint es de la detección continua, no de este archivo
+        
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception(f"No se pudo abrir el video: {video_path}")
+            
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.is_file_source = True
+        self.track_store.set_homography(self._calibration_for(video_path))
+        self._create_tracker(self._tracker_frame_rate(cap))
+        
+        self.frame_index = 0
+        try:
+            while cap.grab():
+                self.frame_index += 1
+                if progress_callback and self.frame_index % progress_interval == 0:
+                    progress_callback(self.frame_index, total_frames)
+                    
+                # Los frames saltados por el stride no se decodifican
+                if self.frame_index % self.frame_stride:
+                    self.metrics.frames_skipped.inc(labels=('stride',))
+                    continue
+                ret, frame = cap.retrieve()
+                if not ret:
+                    continue
+                    
+                self.frame_timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                self._process_frame(frame)
+        finally:
+            cap.release()
+            
+        # Cerrar los tracks que seguían activos al terminar el archivo
+        self._finish_tracks(self.track_store.flush())
+        if progress_callback:
+            progress_callback(self.frame_index, total_frames)
             
+        return self.get_detection_data()
+        
     def _process_video(self):
+        """Hilo de detección: procesar hasta que se detenga y cerrar la sesión al salir"""
+        try:
+            self._detection_loop()
+        finally:
+            self._finish_session()
+            
+    def _detection_loop(self):
         """Procesamiento principal de video"""
         last_frame_time = time.time()
         
         while self.detecting and self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
+            self._check_config_reload()
             
-            if not ret:
+            if not self.cap.grab():
                 # Reiniciar video si llegamos al final
+                self._timestamp_offset = self.frame_timestamp
                 self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self.frame_index = 0
+                continue
+                
+            # Los frames saltados por el stride no se decodifican ni esperan el control de FPS
+            self.frame_index += 1
+            if self.frame_index % self.frame_stride:
+                self.metrics.frames_skipped.inc(labels=('stride',))
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
                 continue
                 
             # Control de FPS
@@ -90,131 +530,360 @@ class DetectorManager:
                 
             last_frame_time = time.time()
             
+            # En archivos se usa el tiempo del video para que la velocidad no dependa del ritmo de proceso
+            if self.is_file_source:
+                self.frame_timestamp = self._timestamp_offset + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            else:
+                self.frame_timestamp = last_frame_time
+            
             # Procesar frame
             processed_frame = self._process_frame(frame)
             
-            # Actualizar UI en el hilo principal
-            self.main_window.root.after(0, self._update_ui, processed_frame)
+            # Actualizar UI en el hilo principal; solo un frame en espera a la vez (los atrasados se descartan)
+            if processed_frame is not None:
+                self._ui_pending = True
+                self.main_window.root.after(0, self._update_ui, processed_frame)
+            
+    def _check_config_reload(self):
+        """Aplicar cambios no estructurales del archivo de configuración sin detener la detección"""
+        reloaded = self.config.check_reload(self.source_settings['nombre'])
+        if reloaded is None:
+            return
+            
+        settings, structural = reloaded
+        previous = self.source_settings
+        try:
+            self._apply_source_settings(settings)
+        except Exception as e:
+            # Un error aquí detendría el hilo de detección: se conservan los ajustes anteriores
+            print(f"No se pudo aplicar la configuración recargada, se conservan los ajustes anteriores: {e}")
+            self._apply_source_settings(previous)
+            return
+        self.source_settings = settings
+        print(f"Configuración recargada para la fuente '{settings['nombre']}'")
+        if structural:
+            print(f"Cambios que requieren reiniciar la detección: {', '.join(structural)}")
             
     def _process_frame(self, frame):
         """Procesar un frame individual"""
+        if self._reset_requested:
+            self._reset_tracking_state()
+        self.metrics.frames_processed.inc()
+            
+        # Filtro de movimiento: en frames estáticos no se ejecuta YOLO y se conservan las anotaciones previas
+        inferred = self.motion_gate is None or self.motion_gate.should_infer(frame)
+        new_vehicles = 0
+        if inferred:
+            boxes, ids, class_names, new_vehicles = self._detect_and_track(frame)
+        else:
+            self.metrics.frames_skipped.inc(labels=('movimiento',))
+        if self.checkpointer is not None:
+            self._publish_checkpoint_state()
+            
+        # Sin ventana, exportación ni espectadores de la vista previa no hay nada que dibujar
+        exporter = self.video_exporter
+        live_server = self.live_server  # Una sola lectura: detener_servidor puede quitarlo en paralelo
+        preview = live_server if (live_server and live_server.wants_frame()) else None
+        if self.headless and exporter is None and preview is None:
+            return None
+            
+        start = time.perf_counter()
+        annotated_frame = None
         try:
-            # Ejecutar detección con tracking
-            results = self.model.track(
+            if inferred:
+                self.renderer.update(boxes, ids, class_names)
+            
+            # Mientras Tk no muestre el frame anterior no se dibuja otro: su buffer sigue en uso
+            if not self.headless and not self._ui_pending:
+                annotated_frame = self.renderer.render(frame, self._display_size(), self.counting_lines)
+            if exporter is not None:
+                export_frame = self.renderer.render(frame, exporter.output_size, self.counting_lines, "export")
+                exporter.write(export_frame, event=new_vehicles > 0)
+            if preview is not None:
+                preview.publish_frame(self.renderer.render(frame, preview.preview_size, self.counting_lines, "preview"))
+        except Exception as e:
+            # Un fallo al dibujar o entregar el frame no debe detener el hilo de detección
+            self.metrics.frame_errors.inc()
+            print(f"Error procesando frame: {e}")
+        self._record_stage_time('render', start)
+        
+        return annotated_frame
+        
+    def _detect_and_track(self, frame):
+        """Ejecutar YOLO con tracking y actualizar trayectorias y conteos; devuelve lo necesario para dibujar"""
+        boxes = np.empty((0, 4), dtype=np.float32)
+        ids = np.empty(0, dtype=np.int64)
+        class_indexes = np.empty(0, dtype=np.int64)
+        confidences = np.empty(0, dtype=np.float32)
+        class_names = []
+        new_vehicles = 0
+        
+        try:
+            # Ejecutar detección; el tracking es una etapa aparte
+            start = time.perf_counter()
+            results = self.model.predict(
                 frame, 
-                persist=True, 
-                tracker="bytetrack.yaml",
+                imgsz=self.imgsz,
+                conf=self.confidence,
                 verbose=False
             )
+            self._record_stage_time('inference', start)
+            
+            # Solo se rastrean vehículos: el tracker no gasta tiempo ni IDs en otras clases
+            start = time.perf_counter()
+            tracks = self.tracker.update(self._extract_vehicle_detections(results[0]), frame)
+            self._record_stage_time('tracking', start)
             
-            if results and len(results) > 0:
-                result = results[0]
+            if len(tracks):
+                boxes = tracks[:, :4]
+                ids = tracks[:, 4].astype(np.int64) + self.track_id_offset
+                self.max_track_id = max(self.max_track_id, int(ids.max()))
+                if self._resumed_tracks is not None or self._resume_aliases:
+                    ids = self._resume_track_ids(ids, boxes)
+                confidences = tracks[:, 5]
+                class_indexes = self.class_index_lut[tracks[:, 6].astype(np.int64)]
                 
-                # Procesar detecciones si hay IDs
-                if result.boxes.id is not None:
-                    self._process_detections(result)
-                    
-                # Obtener frame anotado
-                annotated_frame = result.plot()
-                return annotated_frame
+            self._last_tracks = (ids, boxes)
+            
+            # Actualizar trayectorias y votos (también sin detecciones, para cerrar tracks perdidos)
+            finished = self.track_store.update(ids, boxes, self.frame_timestamp, class_indexes, confidences)
+            new_vehicles = self._process_detections(ids, finished)
+            
+            # Mostrar la clase con más votos de cada track
+            if len(ids):
+                class_names = [self.class_order[i] for i in self.track_store.leading_classes(ids).tolist()]
                 
         except Exception as e:
+            self.metrics.frame_errors.inc()
             print(f"Error procesando frame: {e}")
             
-        return frame
+        return boxes, ids, class_names, new_vehicles
         
-    def _process_detections(self, result):
-        """Procesar detecciones del frame actual - MÉTODO CORREGIDO"""
-        ids = result.boxes.id.cpu().numpy()
-        classes = result.boxes.cls.cpu().numpy()
-        confidences = result.boxes.conf.cpu().numpy()
-        
-        timestamp = datetime.now()
+    def _resume_track_ids(self, ids, boxes):
+        """Devolver su ID del checkpoint a los vehículos que seguían en escena al guardarlo
         
-        for track_id, class_id, confidence in zip(ids, classes, confidences):
-            class_name = self.model.names[int(class_id)]
+        Un track nuevo que aparece sobre la caja de uno guardado, dentro de la ventana en que el
+        tracker conserva tracks perdidos, es el mismo vehículo: si ya estaba contado no se cuenta otra vez.
+        """
+        aliases = self._resume_aliases
+        resumed = self._resumed_tracks
+        self._resume_frames += 1
+        if resumed is not None and (not len(resumed[0]) or self._resume_frames > self.track_store.max_missed_frames):
+            self._resumed_tracks = resumed = None
             
-            # Solo procesar vehículos
-            if class_name in self.vehicle_classes:
-                track_id = int(track_id)
+        if resumed is not None:
+            resumed_ids, resumed_boxes = resumed
+            # Solo tracks que aparecen por primera vez en este frame
+            new_rows = np.array([
+                row for row, track_id in enumerate(ids.tolist())
+                if track_id not in aliases and track_id not in self.first_detection_time
+            ], dtype=np.int64)
+            if len(new_rows):
+                iou = box_iou(boxes[new_rows], resumed_boxes)
+                taken = np.zeros(len(resumed_ids), dtype=bool)
+                for flat in np.argsort(-iou, axis=None):
+                    row, column = divmod(int(flat), len(resumed_ids))
+                    if iou[row, column] < 0.3:
+                        break
+                    track_id = int(ids[new_rows[row]])
+                    if taken[column] or track_id in aliases:
+                        continue
+                    taken[column] = True
+                    aliases[track_id] = int(resumed_ids[column])
+                self._resumed_tracks = (resumed_ids[~taken], resumed_boxes[~taken])
                 
-                # CORREGIDO: Solo agregar al historial si es la primera vez que vemos este vehículo
-                vehicle_key = f"{class_name}_{track_id}"
+        if not aliases:
+            return ids
+        return np.array([aliases.get(track_id, track_id) for track_id in ids.tolist()], dtype=np.int64)
+        
+    def _extract_vehicle_detections(self, result):
+        """Detecciones (Boxes en numpy) solo de las clases de vehículos"""
+        detections = result.boxes.cpu().numpy()
+        return detections[np.isin(detections.cls.astype(np.int64), self.vehicle_class_ids)]
+            
+    def _display_size(self):
+        """Resolución de visualización actual (ancho, alto)"""
+        return getattr(self.main_window, 'display_size', None)
+        
+    def _record_stage_time(self, stage, start):
+        """Registrar duración de una etapa en ms"""
+        elapsed = time.perf_counter() - start
+        self.stage_times[stage].append(elapsed * 1000.0)
+        self.metrics.stage_seconds[stage].observe(elapsed)
+        
+    def _process_detections(self, ids, finished):
+        """Registrar tracks nuevos y asentar la clase de los que cruzan una línea o terminan; devuelve cuántos son nuevos"""
+        timestamp = datetime.now()
+        new_vehicles = 0
+        
+        for track_id in ids.tolist():
+            if track_id not in self.first_detection_time:
+                # Primera detección de este vehículo específico
+                self.first_detection_time[track_id] = timestamp
+                new_vehicles += 1
                 
-                if vehicle_key not in self.tracked_vehicles:
-                    # Primera detección de este vehículo específico
-                    self.tracked_vehicles.add(vehicle_key)
-                    self.first_detection_time[track_id] = timestamp
-                    
-                    # Agregar a contador único
-                    self.vehicle_counters[class_name].add(track_id)
-                    
-                    # Agregar al historial SOLO la primera vez
-                    self.detection_history.append({
-                        'timestamp': timestamp,
-                        'track_id': track_id,
-                        'class_name': class_name,
-                        'class_display': self.vehicle_classes[class_name],
-                        'confidence': float(confidence),
-                        'first_seen': True  # NUEVO: Marcador de primera detección
-                    })
+        # Un cruce de línea de conteo asienta la clase sin esperar al fin del track
+        if self.counting_lines and len(ids):
+            segments = [self.track_store.to_world(line) for line in self.counting_lines]
+            for track_id in self.track_store.crossing_ids(ids, segments).tolist():
+                if not self.counter_store.is_counted(track_id):
+                    vote_sums, vote_hits = self.track_store.class_votes(track_id)
+                    self._settle_vehicle(track_id, vote_sums, vote_hits, 'line_crossing')
                     
-                    print(f"Nueva detección: {self.vehicle_classes[class_name]} ID={track_id}")
+        self._finish_tracks(finished)
+        return new_vehicles
+        
+    def _finish_tracks(self, summaries):
+        """Guardar trayectorias de tracks terminados y asentar la clase de los no contados"""
+        for summary in summaries:
+            track_id = summary['track_id']
+            vote_sums = summary.pop('vote_sums')
+            vote_hits = summary.pop('vote_hits')
+            
+            if not self.counter_store.is_counted(track_id):
+                self._settle_vehicle(track_id, vote_sums, vote_hits, 'track_end')
+            self.counter_store.add_trajectory(summary)
+            self.first_detection_time.pop(track_id, None)
                 
+    def _settle_vehicle(self, track_id, vote_sums, vote_hits, reason):
+        """Fijar la clase final de un track por votación ponderada y contarlo una sola vez"""
+        total_votes = vote_sums.sum()
+        if total_votes <= 0:
+            return
+            
+        ranking = np.argsort(vote_sums)[::-1]
+        best = ranking[0]
+        runner_up = vote_sums[ranking[1]] if len(ranking) > 1 else 0.0
+        class_name = self.class_order[best]
+        
+        # Un único registro por vehículo, con la clase asentada
+        self.counter_store.add_vehicle(track_id, class_name, {
+            'timestamp': self.first_detection_time.get(track_id, datetime.now()),
+            'track_id': track_id,
+            'class_name': class_name,
+            'class_display': self.vehicle_classes[class_name],
+            'confidence': float(vote_sums[best] / vote_hits[best]),  # Confianza media de la clase ganadora
+            'vote_margin': float((vote_sums[best] - runner_up) / total_votes),
+            'settled_by': reason,
+            'first_seen': True  # NUEVO: Marcador de primera detección
+        })
+        
+        print(f"Vehículo contado: {self.vehicle_classes[class_name]} ID={track_id}")
+            
     def _update_ui(self, frame):
         """Actualizar interfaz de usuario"""
-        if not self.detecting:
-            return
+        try:
+            if not self.detecting:
+                return
+                
+            # Actualizar video (PhotoImage copia el buffer)
+            self.main_window.update_video_display(frame)
             
-        # Actualizar video
-        self.main_window.update_video_display(frame)
+            # Actualizar estadísticas
+            self.main_window.update_statistics(self.get_current_counts())
+        finally:
+            # El buffer ya se puede reutilizar
+            self._ui_pending = False
+        
+    def get_snapshot(self):
+        """Último snapshot consistente de los contadores (sin bloqueo, seguro desde cualquier hilo)"""
+        return self.counter_store.snapshot()
         
-        # Actualizar estadísticas
-        counts = {class_name: len(ids) for class_name, ids in self.vehicle_counters.items()}
-        self.main_window.update_statistics(counts)
+    def get_current_counts(self):
+        """Conteo actual de vehículos únicos por clase"""
+        return dict(self.counter_store.snapshot().counts)
         
     def get_detection_data(self):
         """Obtener datos de detección para reportes - MÉTODO MEJORADO"""
+        snapshot = self.counter_store.snapshot()
+        
         # Contar detecciones por tipo
-        type_counts = defaultdict(int)
-        for class_name, ids in self.vehicle_counters.items():
-            type_counts[self.vehicle_classes[class_name]] = len(ids)
-            
-        # NUEVO: Estadísticas adicionales
-        total_unique_vehicles = sum(len(ids) for ids in self.vehicle_counters.values())
+        type_counts = {self.vehicle_classes[class_name]: count for class_name, count in snapshot.counts.items()}
+        
+        # Historial tal como estaba al tomar el snapshot
+        detection_history = snapshot.history()
         
         # Preparar datos del reporte
         report_data = {
             'timestamp': datetime.now(),
             'video_source': self.video_source,
-            'total_detections': total_unique_vehicles,  # CORREGIDO: usar vehículos únicos
-            'detection_counts': dict(type_counts),
-            'detection_history': self.detection_history.copy(),
-            'unique_vehicles': {k: list(v) for k, v in self.vehicle_counters.items()},  # Convertir sets a listas
-            'total_tracked_vehicles': len(self.tracked_vehicles),  # NUEVO: total de vehículos rastreados
+            'total_detections': snapshot.total,  # CORREGIDO: usar vehículos únicos
+            'detection_counts': type_counts,
+            'detection_history': detection_history,
+            'unique_vehicles': snapshot.unique_ids(),
+            'total_tracked_vehicles': snapshot.tracked_count,  # NUEVO: total de vehículos rastreados
+            'trajectory_summary': self._trajectory_report(snapshot, detection_history),
+            'speed_calibrated': self.track_store.calibrated,
             'detection_summary': {  # NUEVO: resumen mejorado
                 'unique_vehicles_by_type': dict(type_counts),
-                'detection_start_time': min([d['timestamp'] for d in self.detection_history]) if self.detection_history else None,
-                'detection_end_time': max([d['timestamp'] for d in self.detection_history]) if self.detection_history else None
+                'detection_start_time': min([d['timestamp'] for d in detection_history]) if detection_history else None,
+                'detection_end_time': max([d['timestamp'] for d in detection_history]) if detection_history else None
             }
         }
         
         return report_data
         
-    def clear_data(self):
+    def _trajectory_report(self, snapshot, detection_history):
+        """Trayectorias terminadas, con el tipo de vehículo asentado de cada track"""
+        track_classes = {d['track_id']: d['class_display'] for d in detection_history}
+        report = [
+            dict(summary, class_display=track_classes[summary['track_id']])
+            for summary in snapshot.trajectories()
+            if summary['track_id'] in track_classes
+        ]
+        return sorted(report, key=lambda t: t['track_id'])
+        
+    def clear_data(self, discard_checkpoint=True):
         """Limpiar todos los datos de detección - MÉTODO ACTUALIZADO"""
-        self.vehicle_counters.clear()
-        self.detection_history.clear()
-        self.tracked_vehicles.clear()  # NUEVO: limpiar vehículos rastreados
+        self.counter_store.clear()
+        
+        # Sin checkpoints en curso se borra el guardado; si están activos, el próximo reescribe todo
+        if discard_checkpoint and self.checkpointer and not self.checkpointer.running:
+            self.checkpointer.discard()
+        
+        # El estado de tracking pertenece al hilo de detección: si está activo, lo limpia él
+        if self.detecting:
+            self._reset_requested = True
+        else:
+            self._reset_tracking_state()
+            
+    def _reset_tracking_state(self):
+        """Limpiar el estado propio del hilo de detección"""
+        self._reset_requested = False
         self.first_detection_time.clear()  # NUEVO: limpiar tiempos de primera detección
+        self.renderer.reset()
+        self.track_store.reset()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        
+        self.tracker.reset()
+        self.track_id_offset = self.max_track_id
+        self._last_tracks = (np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float32))
+        self._resumed_tracks = None
+        self._resume_aliases = {}
         
     def get_detection_statistics(self):
         """NUEVO: Obtener estadísticas detalladas de detección"""
+        snapshot = self.counter_store.snapshot()
         stats = {
-            'total_unique_vehicles': sum(len(ids) for ids in self.vehicle_counters.values()),
-            'vehicles_by_type': {self.vehicle_classes[k]: len(v) for k, v in self.vehicle_counters.items()},
-            'total_detection_events': len(self.detection_history),
+            'total_unique_vehicles': snapshot.total,
+            'vehicles_by_type': {self.vehicle_classes[k]: v for k, v in snapshot.counts.items()},
+            'total_detection_events': snapshot.history_length,
             'tracking_active': self.detecting,
-            'tracked_vehicle_keys': len(self.tracked_vehicles)
+            'tracked_vehicle_keys': snapshot.tracked_count,
+            'active_tracks': len(self.track_store.slot_of),
+            'tracker': self.source_settings['tracker']['tipo'],
+            'snapshot_version': snapshot.version,
+            'stage_times_ms': self.get_performance_stats(),
+            'motion_gate': self.motion_gate.get_stats(self.get_performance_stats()['inference']) if self.motion_gate else None,
+            'video_export': self.video_exporter.get_stats() if self.video_exporter else None,
+            'checkpoint': self.checkpointer.get_stats() if self.checkpointer else None
         }
-        return stats
\ No newline at end of file
+        return stats
+        
+    def get_performance_stats(self):
+        """Obtener tiempo promedio por etapa en ms"""
+        return {
+            stage: (sum(times) / len(times) if times else 0.0)
+            for stage, times in self.stage_times.items()
+        }
\ No newline at end of file
@@ -0,0 +1,126 @@
+import cv2
+import numpy as np
+from collections import deque
+
+class FrameRenderer:
+    """Renderizador ligero de anotaciones para los vehículos contados"""
+
+    # Paleta BGR para diferenciar tracks
+    PALETTE = [
+        (255, 56, 56), (56, 56, 255), (56, 200, 56), (255, 157, 151),
+        (0, 194, 255), (255, 112, 31), (132, 56, 255), (82, 0, 133),
+        (203, 56, 255), (52, 147, 26)
+    ]
+    LINE_COLOR = (0, 255, 255)
+
+    def __init__(self, class_labels, trail_length=20, trail_timeout=30):
+        self.class_labels = class_labels  # Nombre de clase -> etiqueta a mostrar
+        self.trail_length = trail_length
+        self.trail_timeout = trail_timeout  # Frames sin ver un track antes de borrar su estela
+
+        # Detecciones del frame actual (coordenadas de la fuente)
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.class_names = []
+
+        # Estelas por track_id
+        self.trails = {}
+        self.last_seen = {}
+        self.frame_index = 0
+
+        # Buffers reutilizables por destino y resolución (doble buffer para no pisar el frame en pantalla)
+        self._buffers = {}
+        self._buffer_index = {}
+
+    def update(self, boxes, ids, class_names):
+        """Actualizar detecciones actuales y estelas de cada track"""
+        self.frame_index += 1
+        self.boxes = boxes
+        self.ids = ids
+        self.class_names = class_names
+
+        if len(ids):
+            centers = (boxes[:, :2] + boxes[:, 2:]) * 0.5
+            for track_id, center in zip(ids.tolist(), centers.tolist()):
+                trail = self.trails.get(track_id)
+                if trail is None:
+                    trail = self.trails[track_id] = deque(maxlen=self.trail_length)
+                trail.append(center)
+                self.last_seen[track_id] = self.frame_index
+
+        # Olvidar estelas de tracks que ya no aparecen
+        expired = [tid for tid, seen in self.last_seen.items() if self.frame_index - seen > self.trail_timeout]
+        for track_id in expired:
+            del self.trails[track_id]
+            del self.last_seen[track_id]
+
+    def reset(self):
+        """Limpiar detecciones y estelas"""
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.class_names = []
+        self.trails.clear()
+        self.last_seen.clear()
+
+    def render(self, frame, size=None, counting_lines=(), target="display"):
+        """Dibujar anotaciones sobre un buffer reutilizable a la resolución indicada
+        
+        Cada destino (display, export, preview) tiene su propio par de buffers: el
+        frame entregado a uno no se reutiliza al dibujar para otro.
+        """
+        src_h, src_w = frame.shape[:2]
+        width, height = size if size else (src_w, src_h)
+        buffer = self._next_buffer(target, width, height)
+
+        if (width, height) == (src_w, src_h):
+            np.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=buffer, interpolation=cv2.INTER_AREA)
+
+        scale_x = width / src_w
+        scale_y = height / src_h
+
+        # Líneas de conteo
+        for (x1, y1), (x2, y2) in counting_lines:
+            cv2.line(
+                buffer,
+                (int(x1 * scale_x), int(y1 * scale_y)),
+                (int(x2 * scale_x), int(y2 * scale_y)),
+                self.LINE_COLOR, 2
+            )
+
+        if not len(self.ids):
+            return buffer
+
+        boxes = (self.boxes * (scale_x, scale_y, scale_x, scale_y)).astype(np.int32)
+
+        for (x1, y1, x2, y2), track_id, class_name in zip(boxes.tolist(), self.ids.tolist(), self.class_names):
+            color = self.PALETTE[track_id % len(self.PALETTE)]
+
+            # Estela del track
+            trail = self.trails.get(track_id)
+            if trail and len(trail) > 1:
+                points = (np.array(trail) * (scale_x, scale_y)).astype(np.int32)
+                cv2.polylines(buffer, [points], False, color, 2)
+
+            # Caja y etiqueta
+            cv2.rectangle(buffer, (x1, y1), (x2, y2), color, 2)
+            label = f"{self.class_labels.get(class_name, class_name)} #{track_id}"
+            cv2.putText(
+                buffer, label, (x1, max(y1 - 5, 12)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA
+            )
+
+        return buffer
+
+    def _next_buffer(self, target, width, height):
+        """Obtener el siguiente buffer del par asociado al destino y la resolución"""
+        key = (target, width, height)
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            buffers = self._buffers[key] = [
+                np.empty((height, width, 3), dtype=np.uint8),
+                np.empty((height, width, 3), dtype=np.uint8)
+            ]
+        index = self._buffer_index[key] = self._buffer_index.get(key, 1) ^ 1
+        return buffers[index]
@@ -0,0 +1,334 @@
+"""
+Procesamiento distribuido por lotes de videos grabados
+
+Un coordinador encola archivos en una cola SQLite; procesos trabajadores en
+cualquier nodo (con acceso a la base y a los videos, p. ej. un directorio
+compartido) toman trabajos, ejecutan el DetectorManager sin ventana y escriben
+un reporte JSON por clip. El coordinador consolida los conteos al final.
+
+Cada trabajo tomado tiene un plazo (lease) que el trabajador renueva mientras
+avanza; si el proceso muere, el plazo vence y otro trabajador lo retoma, hasta
+agotar los reintentos.
+
+Uso:
+    python -m gui.job_queue encolar videos/ --db lote.db
+    python -m gui.job_queue trabajador --db lote.db --procesos 4 --hilos 2
+    python -m gui.job_queue estado --db lote.db
+    python -m gui.job_queue consolidar --db lote.db
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import socket
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv'}
+
+PENDING = 'pendiente'
+RUNNING = 'en_proceso'
+DONE = 'completado'
+FAILED = 'fallido'
+
+class JobQueue:
+    """Cola de trabajos persistente en SQLite, segura entre procesos"""
+
+    def __init__(self, db_path, max_attempts=3, lease_seconds=300):
+        self.db_path = str(db_path)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds  # Tiempo sin latido antes de considerar muerto a un trabajador
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    video_path TEXT NOT NULL UNIQUE,
+                    status TEXT NOT NULL DEFAULT 'pendiente',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    result_path TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        # isolation_level=None: las transacciones se controlan explícitamente con BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, video_paths):
+        """Encolar videos (los ya encolados se ignoran); devuelve cuántos son nuevos"""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (video_path, created_at, updated_at) VALUES (?, ?, ?)",
+                [(str(Path(path).resolve()), now, now) for path in video_paths]
+            )
+            return conn.total_changes - before
+
+    def claim(self, worker):
+        """Tomar el siguiente trabajo pendiente (o abandonado por un trabajador caído)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE toma el lock de escritura: dos trabajadores nunca toman el mismo trabajo
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("""
+                SELECT * FROM jobs
+                WHERE attempts < ? AND (status = ? OR (status = ? AND lease_expires < ?))
+                ORDER BY id LIMIT 1
+            """, (self.max_attempts, PENDING, RUNNING, now)).fetchone()
+
+            if row is None:
+                # Trabajos abandonados sin reintentos disponibles
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, "Trabajador caído sin reintentos disponibles", RUNNING, now, self.max_attempts)
+                )
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute("""
+                UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, lease_expires = ?,
+                                progress = 0, error = NULL, updated_at = ?
+                WHERE id = ?
+            """, (RUNNING, worker, now + self.lease_seconds, datetime.now().isoformat(), row['id']))
+            conn.execute("COMMIT")
+            return dict(row, attempts=row['attempts'] + 1)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, worker, progress):
+        """Renovar el plazo de un trabajo y registrar su avance (0-1)"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires = ?, progress = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                (time.time() + self.lease_seconds, progress, datetime.now().isoformat(), job_id, worker)
+            )
+
+    def complete(self, job_id, worker, result_path):
+        """Marcar un trabajo como completado; False si el trabajo ya pasó a otro trabajador"""
+        with self._connect() as conn:
+            return conn.execute("""
+                UPDATE jobs SET status = ?, progress = 1, result_path = ?, lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND worker = ? AND status = ?
+            """, (DONE, str(result_path), datetime.now().isoformat(), job_id, worker, RUNNING)).rowcount > 0
+
+    def fail(self, job_id, worker, error):
+        """Registrar un fallo: vuelve a la cola si quedan reintentos; False si el trabajo ya pasó a otro trabajador"""
+        with self._connect() as conn:
+            return conn.execute("""
+                UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END,
+                                error = ?, lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND worker = ? AND status = ?
+            """, (self.max_attempts, PENDING, FAILED, str(error), datetime.now().isoformat(),
+                  job_id, worker, RUNNING)).rowcount > 0
+
+    def retry_failed(self):
+        """Volver a encolar los trabajos fallidos con los reintentos reiniciados"""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, error = NULL WHERE status = ?", (PENDING, FAILED)
+            ).rowcount
+
+    def summary(self):
+        """Cantidad de trabajos por estado"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['total'] for row in rows}
+
+    def jobs(self, status=None):
+        """Listar trabajos, opcionalmente filtrados por estado"""
+        with self._connect() as conn:
+            if status is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,)).fetchall()
+        return [dict(row) for row in rows]
+
+def find_videos(paths):
+    """Expandir archivos y directorios a la lista de videos"""
+    videos = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            videos.extend(sorted(p for p in path.rglob('*') if p.suffix.lower() in VIDEO_EXTENSIONS))
+        elif path.is_file():
+            videos.append(path)
+        else:
+            print(f"Advertencia: no existe {path}")
+    return videos
+
+def run_worker(db_path, results_dir, worker=None, threads=None, poll_interval=5.0, exit_when_empty=True,
+               config_path=None):
+    """Bucle de un trabajador: tomar trabajos hasta vaciar la cola"""
+    # Importaciones diferidas: el coordinador no necesita cargar el modelo
+    from .config import AppConfig
+    from .detector_manager import DetectorManager
+    from .report_generator import ReportGenerator
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(db_path)
+    report_generator = ReportGenerator(results_dir)
+    config = AppConfig(config_path)
+    detector_manager = DetectorManager(config=config)
+    # Calibraciones de todas las fuentes de la configuración (los clips se buscan por ruta resuelta)
+    for name in config.source_names:
+        settings = config.source(name)
+        calibration = settings['calibracion']
+        if calibration:
+            detector_manager.set_calibration(calibration['puntos_imagen'], calibration['puntos_mundo'],
+                                             settings['fuente'])
+
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[{worker}] Procesando trabajo {job['id']}: {job['video_path']} (intento {job['attempts']})")
+
+        def report_progress(frames_done, total_frames):
+            queue.heartbeat(job['id'], worker, frames_done / total_frames if total_frames else 0.0)
+
+        try:
+            data = detector_manager.procesar_archivo(job['video_path'], progress_callback=report_progress)
+            # Un archivo por intento y trabajador: uno con el plazo vencido no pisa el del que tomó el relevo
+            worker_tag = re.sub(r'[^\w.-]', '_', worker)
+            filename = report_generator.generate_report(
+                data, "json",
+                base_name=f"clip_{job['id']:06d}_{Path(job['video_path']).stem}_i{job['attempts']}_{worker_tag}"
+            )
+            # Ruta absoluta: el coordinador la abre al consolidar (directorio de resultados compartido)
+            if queue.complete(job['id'], worker, (Path(results_dir) / filename).resolve()):
+                print(f"[{worker}] Trabajo {job['id']} completado: {data['total_detections']} vehículos")
+            else:
+                print(f"[{worker}] Trabajo {job['id']} terminado tras vencer el plazo: se conserva el resultado del otro trabajador")
+        except Exception as e:
+            print(f"[{worker}] Error en trabajo {job['id']}: {e}")
+            queue.fail(job['id'], worker, e)
+
+def merge_results(queue):
+    """Consolidar los reportes por clip de los trabajos completados"""
+    totals = {}
+    clips = []
+    unreadable = []
+    for job in queue.jobs(DONE):
+        try:
+            with open(job['result_path'], 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError) as e:
+            # Un reporte faltante no debe impedir consolidar el resto
+            print(f"Advertencia: no se pudo leer el resultado del trabajo {job['id']} ({job['result_path']}): {e}")
+            unreadable.append({'video': job['video_path'], 'reporte': job['result_path'], 'error': str(e)})
+            continue
+
+        for vehicle_type, count in result['resumen_por_tipo'].items():
+            totals[vehicle_type] = totals.get(vehicle_type, 0) + count
+        clips.append({
+            'video': job['video_path'],
+            'reporte': job['result_path'],
+            'total_vehiculos_unicos': result['metadata']['total_vehiculos_unicos'],
+            'resumen_por_tipo': result['resumen_por_tipo']
+        })
+
+    summary = queue.summary()
+    return {
+        'metadata': {
+            'fecha_generacion': datetime.now().isoformat(),
+            'clips_completados': len(clips),
+            'clips_pendientes': summary.get(PENDING, 0) + summary.get(RUNNING, 0),
+            'clips_fallidos': summary.get(FAILED, 0),
+            'clips_sin_reporte': len(unreadable),
+            'total_vehiculos_unicos': sum(totals.values())
+        },
+        'resumen_por_tipo': totals,
+        'clips': clips,
+        'reportes_no_leidos': unreadable
+    }
+
+def print_status(queue):
+    """Mostrar el avance del lote"""
+    summary = queue.summary()
+    total = sum(summary.values())
+    done = summary.get(DONE, 0)
+    print(f"Trabajos: {total} | completados: {done} | en proceso: {summary.get(RUNNING, 0)} | "
+          f"pendientes: {summary.get(PENDING, 0)} | fallidos: {summary.get(FAILED, 0)}")
+    if total:
+        print(f"Avance total: {100.0 * done / total:.1f}%")
+    for job in queue.jobs(RUNNING):
+        print(f"  #{job['id']} {Path(job['video_path']).name}: {100.0 * job['progress']:.1f}% ({job['worker']})")
+    for job in queue.jobs(FAILED):
+        print(f"  #{job['id']} {Path(job['video_path']).name}: FALLIDO - {job['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesamiento distribuido de videos por lotes")
+    parser.add_argument("--db", default="lote.db", help="Base SQLite de la cola de trabajos")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    encolar = subparsers.add_parser("encolar", help="Encolar archivos o directorios de video")
+    encolar.add_argument("rutas", nargs="+")
+
+    trabajador = subparsers.add_parser("trabajador", help="Procesar trabajos de la cola")
+    trabajador.add_argument("--resultados", default="reports/clips", help="Directorio de reportes por clip")
+    trabajador.add_argument("--procesos", type=int, default=1, help="Trabajadores locales en paralelo")
+    trabajador.add_argument("--hilos", type=int, help="Hilos de inferencia por trabajador")
+    trabajador.add_argument("--esperar", action="store_true", help="Seguir esperando trabajos nuevos al vaciarse la cola")
+    trabajador.add_argument("--config", help="Archivo de configuración YAML/TOML (modelo, clases, rendimiento)")
+
+    subparsers.add_parser("estado", help="Mostrar el avance del lote")
+    subparsers.add_parser("reintentar", help="Volver a encolar los trabajos fallidos")
+
+    consolidar = subparsers.add_parser("consolidar", help="Generar el reporte consolidado")
+    consolidar.add_argument("--reportes", default="reports", help="Directorio del reporte consolidado")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.db)
+
+    if args.comando == "encolar":
+        added = queue.enqueue(find_videos(args.rutas))
+        print(f"{added} trabajos nuevos encolados")
+    elif args.comando == "trabajador":
+        Path(args.resultados).mkdir(parents=True, exist_ok=True)
+        worker_args = (args.db, args.resultados, None, args.hilos, 5.0, not args.esperar, args.config)
+        if args.procesos == 1:
+            run_worker(*worker_args)
+        else:
+            processes = [
+                multiprocessing.Process(target=run_worker, args=worker_args)
+                for _ in range(args.procesos)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        print_status(queue)
+    elif args.comando == "estado":
+        print_status(queue)
+    elif args.comando == "reintentar":
+        print(f"{queue.retry_failed()} trabajos fallidos vueltos a encolar")
+    elif args.comando == "consolidar":
+        from .report_generator import ReportGenerator
+        filename = ReportGenerator(args.reportes).generate_consolidated_report(merge_results(queue))
+        print(f"Reporte consolidado generado: {filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import asyncio
+import cv2
+import threading
+import time
+
+try:
+    from aiohttp import web
+except ImportError:  # Dependencia opcional
+    web = None
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head><meta charset="utf-8"><title>Detección de Tránsito</title></head>
+<body style="font-family: Arial, sans-serif; background: #f0f0f0;">
+<h2>🚗 Sistema de Detección de Tránsito</h2>
+<img src="/preview.mjpg" style="max-width: 100%; background: black;">
+<pre id="conteos">Conectando...</pre>
+<script>
+const ws = new WebSocket(`ws://${location.host}/ws`);
+ws.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    document.getElementById("conteos").textContent = JSON.stringify(data.totales, null, 2);
+};
+</script>
+</body>
+</html>
+"""
+
+class LiveServer:
+    """Servidor HTTP/WebSocket local con conteos en vivo y vista previa MJPEG
+
+    La codificación JPEG se hace una sola vez por frame de vista previa en el
+    hilo del servidor, y todos los clientes reciben los mismos bytes: el hilo
+    de detección solo entrega una copia del frame a la tasa reducida.
+    """
+
+    def __init__(self, detector_manager, host="127.0.0.1", port=8080, preview_fps=5.0,
+                 preview_size=(640, 360), jpeg_quality=70, push_interval=0.5):
+        if web is None:
+            raise ImportError("El servidor en vivo requiere aiohttp: pip install aiohttp")
+
+        self.detector_manager = detector_manager
+        self.host = host
+        self.port = port
+        self.preview_interval = 1.0 / preview_fps
+        self.preview_size = preview_size
+        self.jpeg_quality = jpeg_quality
+        self.push_interval = push_interval  # Segundos entre envíos de cambios por WebSocket
+
+        self.loop = None
+        self.thread = None
+        self.runner = None
+        self.running = False
+        self._tasks = []
+        self._startup_error = None
+
+        # Vista previa compartida por todos los clientes
+        self.preview_viewers = 0
+        self._last_publish = 0.0
+        self._pending_frame = None
+        self._frame_ready = None
+        self._jpeg = None
+        self._jpeg_sequence = 0
+        self._jpeg_condition = None
+
+        # Clientes WebSocket
+        self._websockets = set()
+
+    def start(self):
+        """Iniciar el servidor en su propio hilo con su propio event loop"""
+        if self.running:
+            return
+        started = threading.Event()
+        self.running = True
+        self._startup_error = None
+        self.thread = threading.Thread(target=self._run, args=(started,), daemon=True)
+        self.thread.start()
+        if not started.wait(timeout=10.0):
+            self.running = False
+            raise RuntimeError(f"El servidor en vivo no terminó de iniciar en {self.host}:{self.port}")
+        if self._startup_error is not None:
+            # Puerto ocupado, dirección inválida, etc.: el hilo ya terminó
+            self.running = False
+            self.thread.join(timeout=5.0)
+            raise self._startup_error
+        print(f"Servidor en vivo disponible en http://{self.host}:{self.port}/")
+
+    def stop(self):
+        """Detener el servidor (no hace nada si nunca llegó a iniciar)"""
+        if not self.running or self.loop is None or not self.loop.is_running():
+            self.running = False
+            return
+        self.running = False
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5.0)
+
+    def wants_frame(self):
+        """Indica al hilo de detección si debe entregar un frame de vista previa"""
+        return self.running and self.preview_viewers > 0 and time.perf_counter() - self._last_publish >= self.preview_interval
+
+    def publish_frame(self, frame):
+        """Entregar un frame anotado (llamado desde el hilo de detección)"""
+        if not self.running:
+            return
+        self._last_publish = time.perf_counter()
+        # Copia: el renderizador reutiliza sus buffers
+        self._pending_frame = frame.copy()
+        try:
+            self.loop.call_soon_threadsafe(self._frame_ready.set)
+        except RuntimeError:  # El loop se cerró entre la comprobación y la llamada
+            pass
+
+    def _run(self, started):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._startup())
+        except Exception as e:
+            # Se informa en start(), en el hilo que lo llamó
+            self._startup_error = e
+            if self.runner is not None:
+                self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+            started.set()
+            return
+        started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _startup(self):
+        self._frame_ready = asyncio.Event()
+        self._jpeg_condition = asyncio.Condition()
+
+        app = web.Application()
+        app.router.add_get("/", self._handle_index)
+        app.router.add_get("/api/conteos", self._handle_counts)
+        app.router.add_get("/api/estadisticas", self._handle_statistics)
+        app.router.add_get("/ws", self._handle_websocket)
+        app.router.add_get("/preview.mjpg", self._handle_preview)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+        self._tasks = [
+            asyncio.ensure_future(self._encode_loop()),
+            asyncio.ensure_future(self._push_loop())
+        ]
+
+    async def _shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        for ws in list(self._websockets):
+            await ws.close()
+        await self.runner.cleanup()
+
+    def _current_counts(self):
+        """Conteos actuales por tipo de vehículo"""
+        return dict(self.detector_manager.get_snapshot().counts)
+
+    async def _handle_index(self, request):
+        return web.Response(text=INDEX_HTML, content_type="text/html")
+
+    async def _handle_counts(self, request):
+        counts = self._current_counts()
+        return web.json_response({'conteos': counts, 'total': sum(counts.values())})
+
+    async def _handle_statistics(self, request):
+        return web.json_response(self.detector_manager.get_detection_statistics())
+
+    async def _handle_websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+
+        # Estado completo al conectar; luego solo cambios
+        await ws.send_json({'tipo': 'inicial', 'cambios': {}, 'totales': self._current_counts()})
+        self._websockets.add(ws)
+        try:
+            async for _ in ws:
+                pass  # Los clientes solo escuchan
+        finally:
+            self._websockets.discard(ws)
+        return ws
+
+    async def _push_loop(self):
+        """Enviar a todos los clientes WebSocket los cambios de conteo"""
+        snapshot = self.detector_manager.get_snapshot()
+        previous = snapshot.counts
+        version = snapshot.version
+        while True:
+            await asyncio.sleep(self.push_interval)
+            snapshot = self.detector_manager.get_snapshot()
+            if snapshot.version == version:
+                continue
+            version = snapshot.version
+            counts = snapshot.counts
+            changes = {
+                name: counts.get(name, 0) - previous.get(name, 0)
+                for name in set(counts) | set(previous)
+                if counts.get(name, 0) != previous.get(name, 0)
+            }
+            previous = counts
+            if not changes or not self._websockets:
+                continue
+
+            message = {'tipo': 'delta', 'version': version, 'cambios': changes, 'totales': counts}
+            await asyncio.gather(
+                *(ws.send_json(message) for ws in list(self._websockets)),
+                return_exceptions=True
+            )
+
+    async def _encode_loop(self):
+        """Codificar a JPEG cada frame de vista previa una sola vez"""
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            frame = self._pending_frame
+            if frame is None:
+                continue
+
+            ok, encoded = await self.loop.run_in_executor(None, cv2.imencode, ".jpg", frame, params)
+            if not ok:
+                continue
+
+            async with self._jpeg_condition:
+                self._jpeg = encoded.tobytes()
+                self._jpeg_sequence += 1
+                self._jpeg_condition.notify_all()
+
+    async def _handle_preview(self, request):
+        response = web.StreamResponse(headers={
+            'Content-Type': 'multipart/x-mixed-replace; boundary=frame',
+            'Cache-Control': 'no-cache'
+        })
+        await response.prepare(request)
+
+        self.preview_viewers += 1
+        sequence = 0
+        try:
+            while self.running:
+                async with self._jpeg_condition:
+                    await self._jpeg_condition.wait_for(lambda: self._jpeg_sequence != sequence)
+                    jpeg = self._jpeg
+                    sequence = self._jpeg_sequence
+
+                await response.write(
+                    b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                    + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n"
+                )
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self.preview_viewers -= 1
+        return response
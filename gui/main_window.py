@@ -7,10 +7,11 @@ from .report_generator import ReportGenerator
 from .styles import AppStyles
 
 class MainWindow:
-    def __init__(self, root):
+    def __init__(self, root, config=None, source_name=None):
         self.root = root
-        self.detector_manager = DetectorManager(self)
-        self.report_generator = ReportGenerator()
+        self.display_size = (640, 480)  # Resolución a la que se renderiza el video
+        self.detector_manager = DetectorManager(self, config=config, source_name=source_name)
+        self.report_generator = ReportGenerator(self.detector_manager.config.outputs['reportes'])
         self.styles = AppStyles()
         
         self.setup_window()
@@ -102,6 +103,22 @@ class MainWindow:
         )
         self.btn_seleccionar.pack(pady=5, fill="x")
         
+        # Opciones de exportación de video anotado
+        self.exportar_video_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            control_frame,
+            text="💾 Guardar video anotado",
+            variable=self.exportar_video_var
+        ).pack(pady=2, anchor="w")
+        
+        export_settings = self.detector_manager.config.outputs['exportacion'] or {}
+        self.solo_eventos_var = tk.BooleanVar(value=bool(export_settings.get('solo_eventos', False)))
+        ttk.Checkbutton(
+            control_frame,
+            text="🎬 Solo clips de eventos",
+            variable=self.solo_eventos_var
+        ).pack(pady=2, anchor="w")
+        
         # Separador
         ttk.Separator(control_frame, orient="horizontal").pack(fill="x", pady=10)
         
@@ -136,6 +153,7 @@ class MainWindow:
             height=480
         )
         self.canvas_video.grid(row=0, column=0, sticky="nsew")
+        self.canvas_video.bind("<Configure>", self._on_canvas_resize)
         
         # Scrollbars
         v_scrollbar = ttk.Scrollbar(video_frame, orient="vertical", command=self.canvas_video.yview)
@@ -277,6 +295,7 @@ class MainWindow:
     def iniciar_deteccion(self):
         """Iniciar la detección de vehículos"""
         try:
+            self.configurar_exportacion()
             self.detector_manager.iniciar_deteccion()
             self.btn_iniciar.config(state="disabled")
             self.btn_detener.config(state="normal")
@@ -286,6 +305,20 @@ class MainWindow:
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo iniciar la detección: {str(e)}")
             
+    def configurar_exportacion(self):
+        """Preparar la exportación del video anotado según las opciones elegidas y la configuración"""
+        output_path = None
+        if self.exportar_video_var.get():
+            output_path = filedialog.asksaveasfilename(
+                title="Guardar video anotado",
+                defaultextension=".mp4",
+                filetypes=[("Video MP4", "*.mp4")]
+            )
+        self.detector_manager.configurar_exportacion_config(
+            output_path or None,
+            events_only=self.solo_eventos_var.get()
+        )
+        
     def detener_deteccion(self):
         """Detener la detección de vehículos"""
         self.detector_manager.detener_deteccion()
@@ -340,7 +373,8 @@ class MainWindow:
             canvas_w = self.canvas_video.winfo_width()
             canvas_h = self.canvas_video.winfo_height()
             
-            if canvas_w > 1 and canvas_h > 1:
+            # Los frames ya llegan a la resolución de visualización desde el renderizador
+            if canvas_w > 1 and canvas_h > 1 and image.size != self.display_size:
                 image = image.resize((min(canvas_w, 800), min(canvas_h, 600)), Image.Resampling.LANCZOS)
             
             photo = ImageTk.PhotoImage(image)
@@ -353,6 +387,11 @@ class MainWindow:
             # Actualizar scroll region
             self.canvas_video.configure(scrollregion=self.canvas_video.bbox("all"))
             
+    def _on_canvas_resize(self, event):
+        """Guardar la resolución de visualización al redimensionar el canvas"""
+        if event.width > 1 and event.height > 1:
+            self.display_size = (min(event.width, 800), min(event.height, 600))
+            
     def update_statistics(self, detection_counts):
         """Actualizar estadísticas de detección"""
         # Mapeo de clases YOLO a nuestros contadores
@@ -0,0 +1,254 @@
+"""
+Métricas del pipeline en formato de exposición de texto de Prometheus
+
+Los contadores e histogramas se actualizan desde el hilo de detección en
+cada frame (una suma y una búsqueda binaria, sin locks: hay un solo
+escritor). Lo que ya existe en otros componentes (conteos por clase, tracks
+activos, cola de exportación, memoria y CPU del proceso) se lee al momento
+de cada consulta, sin costo por frame.
+
+    python app.py --headless --metricas 9100
+    curl http://127.0.0.1:9100/metrics
+"""
+
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+except ImportError:  # Dependencia opcional; en Linux se usa /proc
+    psutil = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos; cubre desde modelos cuantizados en CPU rápida hasta CPU lenta
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Tracking y dibujo de anotaciones: décimas de milisegundo a decenas de milisegundos
+FAST_STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, labelvalues):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)) + "}"
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value))
+
+class _Metric:
+    """Métrica con valores por combinación de etiquetas, o leída de una función al consultar"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function  # Devuelve un valor, {valores_etiquetas: valor} o None
+        self.values = {}
+
+    def samples(self):
+        if self.function is None:
+            return list(self.values.items())
+        value = self.function()
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(key if isinstance(key, tuple) else (key,), v) for key, v in value.items()]
+        return [((), value)]
+
+    def lines(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in self.samples()
+        ]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, labels=()):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+class Histogram:
+    """Histograma de buckets fijos; observe() es una búsqueda binaria y dos sumas"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # El último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self):
+        counts = list(self.bucket_counts)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Conjunto de métricas que se exponen juntas"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus"""
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.lines()
+            except Exception as e:  # Una lectura fallida no debe tumbar la consulta completa
+                print(f"Error leyendo la métrica {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+def resident_memory_bytes():
+    """Memoria residente del proceso (None si no se puede leer en este sistema)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class PipelineMetrics:
+    """Métricas de salud del pipeline de un DetectorManager"""
+
+    def __init__(self, detector_manager):
+        self.detector_manager = detector_manager
+        self.registry = registry = MetricsRegistry()
+
+        # Actualizadas por el hilo de detección
+        self.frames_processed = registry.counter(
+            "deteccion_frames_procesados_total", "Frames entregados al pipeline de detección")
+        self.frames_skipped = registry.counter(
+            "deteccion_frames_saltados_total", "Frames sin inferencia por motivo", ("motivo",))
+        self.frame_errors = registry.counter(
+            "deteccion_frames_con_error_total", "Frames cuya inferencia o tracking falló")
+        self.stage_seconds = {
+            'inference': registry.histogram(
+                "deteccion_inferencia_segundos", "Latencia de inferencia de YOLO por frame"),
+            'tracking': registry.histogram(
+                "deteccion_tracking_segundos", "Tiempo del tracker por frame", FAST_STAGE_BUCKETS),
+            'render': registry.histogram(
+                "deteccion_renderizado_segundos", "Tiempo de dibujo de anotaciones por frame",
+                FAST_STAGE_BUCKETS)
+        }
+
+        # Leídas al consultar
+        registry.gauge("deteccion_activa", "1 si la detección está en curso",
+                       function=lambda: int(detector_manager.detecting))
+        registry.gauge("deteccion_tracks_activos", "Tracks vivos en el almacén de trayectorias",
+                       function=lambda: len(detector_manager.track_store.slot_of))
+        registry.counter("deteccion_vehiculos_total", "Vehículos únicos contados por clase", ("clase",),
+                         function=lambda: dict(detector_manager.counter_store.snapshot().counts))
+        registry.gauge("deteccion_cola_profundidad", "Elementos en espera por cola", ("cola",),
+                       function=self._queue_depths)
+        registry.counter("exportacion_frames_descartados_total",
+                         "Frames descartados por el codificador de video atrasado",
+                         function=self._export_dropped)
+        registry.gauge("process_resident_memory_bytes", "Memoria residente del proceso en bytes",
+                       function=resident_memory_bytes)
+        registry.counter("process_cpu_seconds_total", "Tiempo de CPU de usuario y sistema del proceso",
+                         function=time.process_time)
+
+    def _queue_depths(self):
+        depths = {}
+        exporter = self.detector_manager.video_exporter
+        if exporter is not None:
+            depths['exportacion'] = exporter.frame_queue.qsize()
+        return depths
+
+    def _export_dropped(self):
+        exporter = self.detector_manager.video_exporter
+        return exporter.frames_dropped if exporter is not None else None
+
+    def render(self):
+        return self.registry.render()
+
+class MetricsServer:
+    """Endpoint HTTP local /metrics en un hilo propio (solo biblioteca estándar)"""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        if self.server is not None:
+            return
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Sin una línea de log por cada consulta
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Métricas disponibles en http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=5.0)
+        self.server = None
@@ -0,0 +1,145 @@
+"""
+Filtro de movimiento previo a la inferencia
+
+Compara cada frame, reducido y en escala de grises, contra un fondo con
+promedio móvil; si nada se mueve dentro de la ROI se salta la inferencia.
+El primer frame con movimiento vuelve a inferir de inmediato.
+
+Verificación de conteos con y sin filtro sobre un clip:
+    python -m gui.motion_gate trafico.mp4
+"""
+
+import argparse
+import time
+import cv2
+import numpy as np
+
+class MotionGate:
+    """Filtro barato de movimiento para saltar YOLO en frames estáticos"""
+
+    def __init__(self, width=160, pixel_threshold=25, min_changed_ratio=0.002, learning_rate=0.05,
+                 max_skip=30, roi=None):
+        self.width = width  # Ancho del frame reducido
+        self.pixel_threshold = pixel_threshold  # Diferencia mínima de gris para considerar un píxel cambiado
+        self.min_changed_ratio = min_changed_ratio  # Fracción de la ROI que debe cambiar para haber movimiento
+        self.learning_rate = learning_rate  # Velocidad de adaptación del fondo
+        self.max_skip = max_skip  # Frames consecutivos saltados antes de forzar una inferencia
+        self.roi = roi  # Polígono [(x, y), ...] en píxeles de la fuente; None = frame completo
+        self.reset()
+
+    def reset(self):
+        """Reiniciar fondo y estadísticas"""
+        self.background = None
+        self.roi_mask = None
+        self.roi_pixels = 0
+        self.consecutive_skips = 0
+
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        self.gate_time_ms = 0.0
+
+    def should_infer(self, frame):
+        """Decidir si este frame necesita inferencia"""
+        start = time.perf_counter()
+        motion = self._detect_motion(frame)
+
+        infer = motion or self.consecutive_skips >= self.max_skip
+        self.frames_seen += 1
+        if infer:
+            self.consecutive_skips = 0
+        else:
+            self.consecutive_skips += 1
+            self.frames_skipped += 1
+
+        self.gate_time_ms += (time.perf_counter() - start) * 1000.0
+        return infer
+
+    def _detect_motion(self, frame):
+        src_h, src_w = frame.shape[:2]
+        height = max(1, int(src_h * self.width / src_w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self._build_roi_mask(gray.shape, self.width / src_w, height / src_h)
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        if self.roi_mask is not None:
+            changed = cv2.bitwise_and(changed, self.roi_mask)
+
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        return cv2.countNonZero(changed) >= self.min_changed_ratio * self.roi_pixels
+
+    def _build_roi_mask(self, shape, scale_x, scale_y):
+        """Máscara de la ROI a la resolución reducida"""
+        if self.roi is None:
+            self.roi_mask = None
+            self.roi_pixels = shape[0] * shape[1]
+            return
+        polygon = (np.asarray(self.roi, dtype=np.float32) * (scale_x, scale_y)).astype(np.int32)
+        self.roi_mask = np.zeros(shape, dtype=np.uint8)
+        cv2.fillPoly(self.roi_mask, [polygon], 255)
+        self.roi_pixels = max(1, cv2.countNonZero(self.roi_mask))
+
+    def get_stats(self, inference_ms=0.0):
+        """Proporción de frames saltados y tiempo de CPU ahorrado (estimado con la inferencia media)"""
+        saved_ms = self.frames_skipped * inference_ms - self.gate_time_ms
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_skipped': self.frames_skipped,
+            'skipped_ratio': self.frames_skipped / self.frames_seen if self.frames_seen else 0.0,
+            'gate_ms_per_frame': self.gate_time_ms / self.frames_seen if self.frames_seen else 0.0,
+            'cpu_saved_ms': saved_ms
+        }
+
+def compare_gating(video_path, model_path="yolov8n.pt", **gate_options):
+    """Procesar un clip con y sin filtro de movimiento y comparar conteos y tiempos"""
+    from .detector_manager import DetectorManager
+
+    results = {}
+    for gated in (False, True):
+        detector_manager = DetectorManager(model_path=model_path)
+        if gated:
+            detector_manager.configurar_filtro_movimiento(**gate_options)
+
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        data = detector_manager.procesar_archivo(video_path)
+        results[gated] = {
+            'counts': data['detection_counts'],
+            'wall_s': time.perf_counter() - start_wall,
+            'cpu_s': time.process_time() - start_cpu,
+            'gate': detector_manager.get_detection_statistics()['motion_gate']
+        }
+
+    return {
+        'counts_match': results[False]['counts'] == results[True]['counts'],
+        'ungated': results[False],
+        'gated': results[True]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar conteos con y sin filtro de movimiento")
+    parser.add_argument("video")
+    parser.add_argument("--modelo", default="yolov8n.pt")
+    parser.add_argument("--ancho", type=int, default=160, help="Ancho del frame reducido")
+    parser.add_argument("--umbral", type=float, default=0.002, help="Fracción mínima de píxeles cambiados")
+    args = parser.parse_args()
+
+    comparison = compare_gating(args.video, args.modelo, width=args.ancho, min_changed_ratio=args.umbral)
+    ungated, gated = comparison['ungated'], comparison['gated']
+
+    print(f"Conteos sin filtro: {ungated['counts']}")
+    print(f"Conteos con filtro: {gated['counts']}")
+    print(f"Conteos coinciden: {'SÍ' if comparison['counts_match'] else 'NO'}")
+    print(f"Frames saltados: {gated['gate']['frames_skipped']}/{gated['gate']['frames_seen']} "
+          f"({100.0 * gated['gate']['skipped_ratio']:.1f}%)")
+    print(f"CPU: {ungated['cpu_s']:.1f} s sin filtro, {gated['cpu_s']:.1f} s con filtro "
+          f"(ahorro estimado {gated['gate']['cpu_saved_ms'] / 1000.0:.1f} s)")
+    print(f"Tiempo real: {ungated['wall_s']:.1f} s sin filtro, {gated['wall_s']:.1f} s con filtro")
+
+if __name__ == "__main__":
+    main()
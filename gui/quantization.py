@@ -0,0 +1,281 @@
+"""
+Inferencia cuantizada en CPU (INT8 / FP16) y evaluación contra el modelo FP32
+
+Modos:
+    int8-estatico  ONNX Runtime, pesos y activaciones INT8 calibrados con frames del propio video (por defecto)
+    int8-dinamico  ONNX Runtime, pesos INT8 sin calibración; genera ConvInteger, que en CPU
+                   suele ser más lento que el FP32
+    fp16           OpenVINO, pesos FP16
+
+La evaluación ejecuta ambos modelos sobre un clip de referencia y compara los
+conteos únicos por clase (con tracking) y la concordancia de detecciones
+frame a frame, junto con el tiempo de inferencia de cada uno.
+
+Uso:
+    python -m gui.quantization --modelo yolov8n.pt --video trafico.mp4 --modo int8-estatico
+    python -m gui.quantization --modelo yolov8n.pt --candidato yolov8n_int8.onnx --video trafico.mp4
+"""
+
+import argparse
+import json
+import time
+import cv2
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+from ultralytics import YOLO
+from .trackers import box_iou
+
+try:
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+except ImportError:  # Dependencia opcional
+    onnxruntime = None
+    CalibrationDataReader = object
+
+QUANTIZATION_MODES = ['int8-dinamico', 'int8-estatico', 'fp16']
+
+def sample_frames(video_path, count=200):
+    """Tomar frames equiespaciados de un video para calibración"""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise Exception(f"No se pudo abrir el video: {video_path}")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    try:
+        for index in np.linspace(0, max(total_frames - 1, 0), num=min(count, max(total_frames, 1)), dtype=np.int64):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+def preprocess(frame, imgsz):
+    """Letterbox + RGB + NCHW float32 en [0, 1], igual que el preprocesado de YOLOv8"""
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized = cv2.resize(frame, (int(round(width * scale)), int(round(height * scale))), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1))[None].astype(np.float32) / 255.0
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Lector de datos de calibración para la cuantización estática de ONNX Runtime"""
+
+    def __init__(self, frames, input_name, imgsz):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._frames = iter(frames)
+
+    def get_next(self):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        return {self.input_name: preprocess(frame, self.imgsz)}
+
+    def rewind(self):
+        pass
+
+def quantize_model(model_path, mode, video_path=None, samples=200, imgsz=640):
+    """Generar un modelo cuantizado y devolver su ruta"""
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Modo de cuantización no soportado: {mode}")
+
+    model = YOLO(model_path)
+
+    if mode == 'fp16':
+        # OpenVINO ejecuta FP16 en CPU; ultralytics carga el directorio exportado directamente
+        return model.export(format="openvino", imgsz=imgsz, half=True)
+
+    if onnxruntime is None:
+        raise ImportError("La cuantización INT8 requiere onnx y onnxruntime: pip install onnx onnxruntime")
+
+    onnx_path = Path(model.export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True))
+
+    if mode == 'int8-dinamico':
+        output_path = onnx_path.with_name(f"{onnx_path.stem}_int8_dinamico.onnx")
+        quantize_dynamic(str(onnx_path), str(output_path), weight_type=QuantType.QUInt8)
+        return str(output_path)
+
+    if video_path is None:
+        raise ValueError("La cuantización estática requiere un video para calibrar")
+
+    frames = sample_frames(video_path, samples)
+    input_name = onnxruntime.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = FrameCalibrationReader(frames, input_name, imgsz)
+
+    output_path = onnx_path.with_name(f"{onnx_path.stem}_int8_estatico.onnx")
+    quantize_static(
+        str(onnx_path), str(output_path), reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return str(output_path)
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Emparejar detecciones de la misma clase por IoU (greedy); devuelve cantidad de coincidencias"""
+    ref_boxes, ref_classes = reference
+    cand_boxes, cand_classes = candidate
+    if not len(ref_boxes) or not len(cand_boxes):
+        return 0
+
+    iou = box_iou(ref_boxes, cand_boxes)
+    iou[ref_classes[:, None] != cand_classes[None, :]] = 0.0
+
+    matches = 0
+    while True:
+        ref_index, cand_index = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[ref_index, cand_index] < iou_threshold:
+            break
+        matches += 1
+        iou[ref_index, :] = 0.0
+        iou[:, cand_index] = 0.0
+    return matches
+
+def detection_agreement(reference_model, candidate_model, video_path, class_ids, max_frames=300, imgsz=640):
+    """Concordancia de detecciones frame a frame y tiempo de inferencia de cada modelo"""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise Exception(f"No se pudo abrir el video: {video_path}")
+
+    totals = {'reference': 0, 'candidate': 0, 'matched': 0}
+    times = {'reference': [], 'candidate': []}
+    frames = 0
+
+    def predict(model, frame, key):
+        start = time.perf_counter()
+        result = model.predict(frame, imgsz=imgsz, classes=class_ids, verbose=False)[0]
+        times[key].append((time.perf_counter() - start) * 1000.0)
+        return result.boxes.xyxy.cpu().numpy(), result.boxes.cls.cpu().numpy().astype(np.int64)
+
+    try:
+        while frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            reference = predict(reference_model, frame, 'reference')
+            candidate = predict(candidate_model, frame, 'candidate')
+            totals['reference'] += len(reference[0])
+            totals['candidate'] += len(candidate[0])
+            totals['matched'] += match_detections(reference, candidate)
+            frames += 1
+    finally:
+        cap.release()
+
+    recall = totals['matched'] / totals['reference'] if totals['reference'] else 1.0
+    precision = totals['matched'] / totals['candidate'] if totals['candidate'] else 1.0
+    reference_ms = float(np.mean(times['reference'])) if times['reference'] else 0.0
+    candidate_ms = float(np.mean(times['candidate'])) if times['candidate'] else 0.0
+
+    return {
+        'frames_evaluados': frames,
+        'detecciones_fp32': totals['reference'],
+        'detecciones_candidato': totals['candidate'],
+        'detecciones_coincidentes': totals['matched'],
+        'recall_vs_fp32': recall,
+        'precision_vs_fp32': precision,
+        'f1_vs_fp32': 2 * precision * recall / (precision + recall) if (precision + recall) else 0.0,
+        'inferencia_ms_fp32': reference_ms,
+        'inferencia_ms_candidato': candidate_ms,
+        'aceleracion': reference_ms / candidate_ms if candidate_ms else None
+    }
+
+def evaluate(reference_path, candidate_path, video_path, max_frames=300, imgsz=640):
+    """Comparar un modelo cuantizado contra el FP32 en un clip de referencia"""
+    # Importación diferida: el DetectorManager carga su propio modelo
+    from .detector_manager import DetectorManager
+
+    # Conteos únicos por clase con el pipeline completo (tracking + votación)
+    counts = {}
+    for key, model_path in (('fp32', reference_path), ('candidato', candidate_path)):
+        detector_manager = DetectorManager(model_path=model_path)
+        detector_manager.imgsz = imgsz  # Un ONNX estático solo acepta el tamaño con que se exportó
+        data = detector_manager.procesar_archivo(str(video_path))
+        counts[key] = data['detection_counts']
+
+    vehicle_types = sorted(set(counts['fp32']) | set(counts['candidato']))
+    count_comparison = {
+        vehicle_type: {
+            'fp32': counts['fp32'].get(vehicle_type, 0),
+            'candidato': counts['candidato'].get(vehicle_type, 0),
+            'diferencia': counts['candidato'].get(vehicle_type, 0) - counts['fp32'].get(vehicle_type, 0)
+        }
+        for vehicle_type in vehicle_types
+    }
+
+    reference_model = YOLO(reference_path, task="detect")
+    candidate_model = YOLO(candidate_path, task="detect")
+    class_ids = detector_manager.vehicle_class_ids.tolist()
+    agreement = detection_agreement(reference_model, candidate_model, video_path, class_ids, max_frames, imgsz)
+
+    total_fp32 = sum(c['fp32'] for c in count_comparison.values())
+    total_candidate = sum(c['candidato'] for c in count_comparison.values())
+
+    return {
+        'fecha_evaluacion': datetime.now().isoformat(),
+        'modelo_fp32': str(reference_path),
+        'modelo_candidato': str(candidate_path),
+        'video_referencia': str(video_path),
+        'conteos_por_tipo': count_comparison,
+        'total_fp32': total_fp32,
+        'total_candidato': total_candidate,
+        'error_relativo_conteo': abs(total_candidate - total_fp32) / total_fp32 if total_fp32 else 0.0,
+        'concordancia_detecciones': agreement
+    }
+
+def print_evaluation(report):
+    """Mostrar el reporte de evaluación de forma legible"""
+    agreement = report['concordancia_detecciones']
+    print("=" * 60)
+    print(f"FP32: {report['modelo_fp32']}  vs  candidato: {report['modelo_candidato']}")
+    print("-" * 60)
+    print(f"{'Tipo':15} {'FP32':>6} {'Cand.':>6} {'Dif.':>6}")
+    for vehicle_type, counts in report['conteos_por_tipo'].items():
+        print(f"{vehicle_type:15} {counts['fp32']:6d} {counts['candidato']:6d} {counts['diferencia']:+6d}")
+    print(f"{'TOTAL':15} {report['total_fp32']:6d} {report['total_candidato']:6d}")
+    print(f"Error relativo de conteo: {100.0 * report['error_relativo_conteo']:.1f}%")
+    print("-" * 60)
+    print(f"Concordancia de detecciones ({agreement['frames_evaluados']} frames): "
+          f"recall {agreement['recall_vs_fp32']:.3f}, precisión {agreement['precision_vs_fp32']:.3f}, "
+          f"F1 {agreement['f1_vs_fp32']:.3f}")
+    speedup = f"{agreement['aceleracion']:.2f}x" if agreement['aceleracion'] else "N/A"
+    print(f"Inferencia: FP32 {agreement['inferencia_ms_fp32']:.1f} ms, "
+          f"candidato {agreement['inferencia_ms_candidato']:.1f} ms ({speedup})")
+    print("=" * 60)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuantización INT8/FP16 y evaluación contra FP32")
+    parser.add_argument("--modelo", default="yolov8n.pt", help="Modelo FP32 de referencia")
+    parser.add_argument("--video", required=True, help="Clip de referencia (y de calibración)")
+    parser.add_argument("--modo", choices=QUANTIZATION_MODES, default="int8-estatico")
+    parser.add_argument("--candidato", help="Evaluar un modelo ya cuantizado en lugar de generarlo")
+    parser.add_argument("--muestras", type=int, default=200, help="Frames de calibración")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--frames", type=int, default=300, help="Frames para la concordancia de detecciones")
+    parser.add_argument("--reportes", default="reports")
+    args = parser.parse_args()
+
+    candidate = args.candidato or quantize_model(args.modelo, args.modo, args.video, args.muestras, args.imgsz)
+    print(f"Modelo candidato: {candidate}")
+
+    report = evaluate(args.modelo, candidate, args.video, args.frames, args.imgsz)
+    print_evaluation(report)
+
+    reports_dir = Path(args.reportes)
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    filepath = reports_dir / f"evaluacion_cuantizacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Reporte de evaluación: {filepath}")
+
+if __name__ == "__main__":
+    main()
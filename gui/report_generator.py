@@ -6,26 +6,27 @@ import tkinter as tk
 from tkinter import messagebox, filedialog
 
 class ReportGenerator:
-    def __init__(self):
-        self.reports_dir = Path("reports")
-        self.reports_dir.mkdir(exist_ok=True)
+    def __init__(self, reports_dir="reports"):
+        self.reports_dir = Path(reports_dir)
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
         
-    def generate_report(self, data, format_type="json"):
+    def generate_report(self, data, format_type="json", base_name=None):
         """Generar reporte en el formato especificado"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_name = base_name or f"reporte_trafico_{timestamp}"
         
         if format_type == "json":
-            return self._generate_json_report(data, timestamp)
+            return self._generate_json_report(data, base_name)
         elif format_type == "csv":
-            return self._generate_csv_report(data, timestamp)
+            return self._generate_csv_report(data, base_name)
         elif format_type == "txt":
-            return self._generate_text_report(data, timestamp)
+            return self._generate_text_report(data, base_name)
         else:
             raise ValueError(f"Formato no soportado: {format_type}")
             
-    def _generate_json_report(self, data, timestamp):
+    def _generate_json_report(self, data, base_name):
         """Generar reporte en formato JSON - MEJORADO"""
-        filename = f"reporte_trafico_{timestamp}.json"
+        filename = f"{base_name}.json"
         filepath = self.reports_dir / filename
         
         # Preparar datos para JSON (convertir objetos no serializables)
@@ -42,7 +43,8 @@ class ReportGenerator:
             },
             'resumen_por_tipo': data['detection_counts'],
             'vehiculos_unicos_detectados': data.get('unique_vehicles', {}),  # NUEVO: IDs únicos por tipo
-            'detecciones_primera_aparicion': []  # NUEVO: solo primeras detecciones
+            'detecciones_primera_aparicion': [],  # NUEVO: solo primeras detecciones
+            'trayectorias': [self._trajectory_entry(t) for t in data.get('trajectory_summary', [])]
         }
         
         # Agregar historial de PRIMERAS detecciones (sin duplicados)
@@ -52,18 +54,55 @@ class ReportGenerator:
                 'id_seguimiento': detection['track_id'],
                 'tipo_vehiculo': detection['class_display'],
                 'confianza': detection['confidence'],
+                'margen_votacion': detection.get('vote_margin'),  # Ventaja de la clase asentada sobre la segunda
                 'primera_deteccion': detection.get('first_seen', True)
             })
             
+        json_data['metadata']['velocidad_calibrada'] = data.get('speed_calibrated', False)
+            
         # Escribir archivo JSON
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(json_data, f, indent=2, ensure_ascii=False)
             
         return filename
         
-    def _generate_csv_report(self, data, timestamp):
+    def generate_consolidated_report(self, merged_data, base_name=None):
+        """Generar reporte JSON consolidado a partir de los resultados de varios clips"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{base_name or f'reporte_consolidado_{timestamp}'}.json"
+        filepath = self.reports_dir / filename
+        
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(merged_data, f, indent=2, ensure_ascii=False)
+            
+        return filename
+        
+    def _trajectory_entry(self, trajectory):
+        """Convertir un resumen de trayectoria al formato del reporte"""
+        return {
+            'id_seguimiento': trajectory['track_id'],
+            'tipo_vehiculo': trajectory['class_display'],
+            'velocidad_promedio_kmh': self._round(trajectory['avg_speed_kmh'], 1),
+            'velocidad_promedio_px_s': self._round(trajectory['avg_speed_px_s'], 1),
+            'direccion': trajectory['direction'],
+            'direccion_grados': self._round(trajectory['direction_deg'], 1),
+            'tiempo_permanencia_s': self._round(trajectory['dwell_time_s'], 2)
+        }
+        
+    def _round(self, value, digits):
+        return round(value, digits) if value is not None else None
+        
+    def _format_speed(self, trajectory):
+        """Velocidad legible: km/h si la fuente está calibrada, px/s si no"""
+        if trajectory['avg_speed_kmh'] is not None:
+            return f"{trajectory['avg_speed_kmh']:.1f} km/h"
+        if trajectory['avg_speed_px_s'] is not None:
+            return f"{trajectory['avg_speed_px_s']:.1f} px/s"
+        return 'N/A'
+        
+    def _generate_csv_report(self, data, base_name):
         """Generar reporte en formato CSV - MEJORADO"""
-        filename = f"reporte_trafico_{timestamp}.csv"
+        filename = f"{base_name}.csv"
         filepath = self.reports_dir / filename
         
         with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
@@ -95,7 +134,7 @@ class ReportGenerator:
             
             # Detecciones únicas (primera aparición)
             writer.writerow(['PRIMERA DETECCIÓN DE CADA VEHÍCULO'])
-            writer.writerow(['Timestamp', 'ID Seguimiento', 'Tipo Vehículo', 'Confianza', 'Estado'])
+            writer.writerow(['Timestamp', 'ID Seguimiento', 'Tipo Vehículo', 'Confianza', 'Margen Votación', 'Estado'])
             
             for detection in data['detection_history']:
                 writer.writerow([
@@ -103,14 +142,30 @@ class ReportGenerator:
                     detection['track_id'],
                     detection['class_display'],
                     f"{detection['confidence']:.2f}",
+                    f"{detection['vote_margin']:.2f}" if 'vote_margin' in detection else 'N/A',
                     'Primera detección' if detection.get('first_seen', True) else 'Detección continua'
                 ])
                 
+            # Trayectorias: velocidad, dirección y permanencia por vehículo
+            trajectories = data.get('trajectory_summary', [])
+            if trajectories:
+                writer.writerow([])  # Línea vacía
+                writer.writerow(['TRAYECTORIAS POR VEHÍCULO'])
+                writer.writerow(['ID Seguimiento', 'Tipo Vehículo', 'Velocidad Promedio', 'Dirección', 'Permanencia (s)'])
+                for trajectory in trajectories:
+                    writer.writerow([
+                        trajectory['track_id'],
+                        trajectory['class_display'],
+                        self._format_speed(trajectory),
+                        trajectory['direction'] or 'N/A',
+                        f"{trajectory['dwell_time_s']:.2f}"
+                    ])
+                
         return filename
         
-    def _generate_text_report(self, data, timestamp):
+    def _generate_text_report(self, data, base_name):
         """Generar reporte en formato texto - MEJORADO"""
-        filename = f"reporte_trafico_{timestamp}.txt"
+        filename = f"{base_name}.txt"
         filepath = self.reports_dir / filename
         
         with open(filepath, 'w', encoding='utf-8') as f:
@@ -160,7 +215,7 @@ class ReportGenerator:
             # Cronología de primeras detecciones
             f.write("⏰ CRONOLOGÍA DE PRIMERAS DETECCIONES\n")
             f.write("-" * 60 + "\n")
-            f.write(f"{'Hora':12} {'ID':4} {'Tipo':15} {'Confianza':10}\n")
+            f.write(f"{'Hora':12} {'ID':4} {'Tipo':15} {'Confianza':10} {'Margen':7}\n")
             f.write("-" * 60 + "\n")
             
             # Ordenar por timestamp
@@ -168,7 +223,22 @@ class ReportGenerator:
             
             for detection in sorted_detections:
                 time_str = detection['timestamp'].strftime('%H:%M:%S.%f')[:-3]
-                f.write(f"{time_str:12} {detection['track_id']:4d} {detection['class_display']:15} {detection['confidence']:8.2f}\n")
+                f.write(f"{time_str:12} {detection['track_id']:4d} {detection['class_display']:15} {detection['confidence']:8.2f}")
+                f.write(f"   {detection['vote_margin']:5.2f}\n" if 'vote_margin' in detection else "\n")
+            
+            # Trayectorias
+            trajectories = data.get('trajectory_summary', [])
+            if trajectories:
+                f.write("\n🛣️  TRAYECTORIAS POR VEHÍCULO\n")
+                f.write("-" * 60 + "\n")
+                f.write(f"{'ID':4} {'Tipo':15} {'Velocidad':14} {'Dirección':10} {'Permanencia':11}\n")
+                f.write("-" * 60 + "\n")
+                for trajectory in trajectories:
+                    f.write(
+                        f"{trajectory['track_id']:4d} {trajectory['class_display']:15} "
+                        f"{self._format_speed(trajectory):14} {trajectory['direction'] or 'N/A':10} "
+                        f"{trajectory['dwell_time_s']:9.2f} s\n"
+                    )
             
             f.write("\n" + "=" * 70 + "\n")
             f.write("Reporte generado por Sistema de Detección de Tráfico\n")
@@ -0,0 +1,231 @@
+import math
+import numpy as np
+
+class TrackStore:
+    """Almacén vectorizado de trayectorias con buffers circulares por track activo
+
+    Cada track activo ocupa un slot en arreglos NumPy preasignados; al terminar
+    el track se resume (velocidad media, dirección, permanencia) y el slot se
+    libera, por lo que la memoria depende de los tracks activos y no del historial.
+    Cada slot acumula también los votos de clase ponderados por confianza.
+    """
+
+    DIRECTIONS = ['E', 'NE', 'N', 'NO', 'O', 'SO', 'S', 'SE']
+
+    def __init__(self, history_length=32, initial_capacity=32, max_missed_frames=30, homography=None, num_classes=1):
+        self.history_length = history_length
+        self.num_classes = num_classes
+        self.max_missed_frames = max_missed_frames  # Frames procesados sin ver un track antes de cerrarlo
+        self.homography = None
+        self.set_homography(homography)
+
+        self.slot_of = {}  # track_id -> slot
+        self.frame_index = 0
+        self._allocate(initial_capacity)
+
+    def _allocate(self, capacity):
+        """Reservar arreglos para la capacidad indicada conservando los datos existentes"""
+        old_capacity = getattr(self, 'capacity', 0)
+        history = self.history_length
+
+        def grow(name, shape, dtype):
+            array = np.zeros(shape, dtype=dtype)
+            if old_capacity:
+                array[:old_capacity] = getattr(self, name)
+            setattr(self, name, array)
+
+        grow('track_ids', capacity, np.int64)
+        grow('positions', (capacity, history, 2), np.float64)  # Puntos en coordenadas del mundo
+        grow('times', (capacity, history), np.float64)
+        grow('heads', capacity, np.int64)  # Próxima posición de escritura del buffer circular
+        grow('lengths', capacity, np.int64)  # Puntos válidos en el buffer
+        grow('first_positions', (capacity, 2), np.float64)
+        grow('first_times', capacity, np.float64)
+        grow('last_seen', capacity, np.int64)
+        grow('speed_sums', capacity, np.float64)
+        grow('speed_counts', capacity, np.int64)
+        grow('vote_sums', (capacity, self.num_classes), np.float64)  # Suma de confianzas por clase
+        grow('vote_hits', (capacity, self.num_classes), np.int64)  # Frames detectado como cada clase
+
+        self.free_slots = list(range(capacity - 1, old_capacity - 1, -1)) + getattr(self, 'free_slots', [])
+        self.capacity = capacity
+
+    def set_homography(self, homography):
+        """Establecer homografía píxel -> metros (None = trabajar en píxeles)"""
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64).reshape(3, 3)
+
+    @property
+    def calibrated(self):
+        return self.homography is not None
+
+    def to_world(self, points):
+        """Transformar puntos (N, 2) de píxeles a coordenadas del mundo"""
+        points = np.asarray(points, dtype=np.float64)
+        if self.homography is None:
+            return points
+        projected = np.hstack([points, np.ones((len(points), 1))]) @ self.homography.T
+        return projected[:, :2] / projected[:, 2:3]
+
+    def update(self, ids, boxes, timestamp, class_indexes=None, confidences=None):
+        """Registrar las detecciones de un frame procesado; devuelve los resúmenes de tracks terminados"""
+        self.frame_index += 1
+
+        if len(ids):
+            # Punto de contacto con el suelo: centro inferior de la caja
+            ground_points = np.column_stack([(boxes[:, 0] + boxes[:, 2]) * 0.5, boxes[:, 3]])
+            world_points = self.to_world(ground_points)
+            slots = np.array([self._slot_for(track_id) for track_id in ids.tolist()], dtype=np.int64)
+
+            # Inicializar tracks nuevos
+            new = self.lengths[slots] == 0
+            if new.any():
+                self.first_positions[slots[new]] = world_points[new]
+                self.first_times[slots[new]] = timestamp
+
+            # Escribir en los buffers circulares
+            heads = self.heads[slots]
+            self.positions[slots, heads] = world_points
+            self.times[slots, heads] = timestamp
+            self.heads[slots] = (heads + 1) % self.history_length
+            self.lengths[slots] = np.minimum(self.lengths[slots] + 1, self.history_length)
+            self.last_seen[slots] = self.frame_index
+
+            # Velocidad instantánea sobre la ventana del buffer, acumulada para el promedio
+            speeds, valid = self._window_speeds(slots)
+            self.speed_sums[slots[valid]] += speeds[valid]
+            self.speed_counts[slots[valid]] += 1
+
+            # Votación de clase ponderada por confianza
+            if class_indexes is not None:
+                np.add.at(self.vote_sums, (slots, class_indexes), confidences)
+                np.add.at(self.vote_hits, (slots, class_indexes), 1)
+
+        return self._expire()
+
+    def _slot_for(self, track_id):
+        """Obtener (o asignar) el slot de un track"""
+        slot = self.slot_of.get(track_id)
+        if slot is None:
+            if not self.free_slots:
+                self._allocate(self.capacity * 2)
+            slot = self.free_slots.pop()
+            self.slot_of[track_id] = slot
+            self.track_ids[slot] = track_id
+            self.heads[slot] = 0
+            self.lengths[slot] = 0
+            self.speed_sums[slot] = 0.0
+            self.speed_counts[slot] = 0
+            self.vote_sums[slot] = 0.0
+            self.vote_hits[slot] = 0
+        return slot
+
+    def _window_speeds(self, slots):
+        """Velocidad (unidades/s) entre el punto más antiguo y el más reciente del buffer"""
+        newest = (self.heads[slots] - 1) % self.history_length
+        oldest = (self.heads[slots] - self.lengths[slots]) % self.history_length
+        displacement = self.positions[slots, newest] - self.positions[slots, oldest]
+        elapsed = self.times[slots, newest] - self.times[slots, oldest]
+        valid = elapsed > 0
+        speeds = np.zeros(len(slots))
+        speeds[valid] = np.hypot(displacement[valid, 0], displacement[valid, 1]) / elapsed[valid]
+        return speeds, valid
+
+    def class_votes(self, track_id):
+        """Votos acumulados (suma de confianzas, frames) por clase de un track activo"""
+        slot = self.slot_of[track_id]
+        return self.vote_sums[slot].copy(), self.vote_hits[slot].copy()
+
+    def leading_classes(self, ids):
+        """Clase con más votos de cada track indicado"""
+        slots = np.array([self.slot_of[track_id] for track_id in ids.tolist()], dtype=np.int64)
+        return np.argmax(self.vote_sums[slots], axis=1)
+
+    def crossing_ids(self, ids, segments):
+        """IDs cuyo último desplazamiento cruza algún segmento [(a, b), ...] en coordenadas del mundo"""
+        if not len(ids) or not len(segments):
+            return np.empty(0, dtype=np.int64)
+
+        slots = np.array([self.slot_of[track_id] for track_id in ids.tolist()], dtype=np.int64)
+        heads = self.heads[slots]
+        previous = self.positions[slots, (heads - 2) % self.history_length]
+        current = self.positions[slots, (heads - 1) % self.history_length]
+        movement = current - previous
+
+        def cross(u, v):
+            return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+        crossed = np.zeros(len(slots), dtype=bool)
+        for start, end in segments:
+            start = np.asarray(start, dtype=np.float64)
+            line = np.asarray(end, dtype=np.float64) - start
+            # Los extremos del movimiento quedan a lados opuestos de la línea y viceversa
+            side_previous = cross(line, previous - start)
+            side_current = cross(line, current - start)
+            side_start = cross(movement, start - previous)
+            side_end = cross(movement, start + line - previous)
+            crossed |= (side_previous * side_current < 0) & (side_start * side_end < 0)
+
+        return ids[crossed & (self.lengths[slots] >= 2)]
+
+    def _expire(self):
+        """Cerrar los tracks que llevan demasiados frames sin aparecer"""
+        if not self.slot_of:
+            return []
+        expired = [
+            track_id for track_id, slot in self.slot_of.items()
+            if self.frame_index - self.last_seen[slot] > self.max_missed_frames
+        ]
+        return [self.finish(track_id) for track_id in expired]
+
+    def finish(self, track_id):
+        """Cerrar un track, liberar su slot y devolver su resumen"""
+        slot = self.slot_of.pop(track_id)
+        summary = self.summarize_slot(slot)
+        self.lengths[slot] = 0
+        self.free_slots.append(slot)
+        return summary
+
+    def flush(self):
+        """Cerrar todos los tracks activos"""
+        return [self.finish(track_id) for track_id in list(self.slot_of)]
+
+    def summarize_slot(self, slot):
+        """Resumen de trayectoria: velocidad media, dirección y tiempo de permanencia"""
+        newest = (self.heads[slot] - 1) % self.history_length
+        last_position = self.positions[slot, newest]
+        displacement = last_position - self.first_positions[slot]
+        dwell_time = float(self.times[slot, newest] - self.first_times[slot])
+
+        average_speed = None
+        if self.speed_counts[slot]:
+            average_speed = float(self.speed_sums[slot] / self.speed_counts[slot])
+
+        distance = float(np.hypot(*displacement))
+        direction_deg = None
+        direction = None
+        if distance > 0:
+            # En píxeles el eje y crece hacia abajo: se invierte para que "N" sea hacia arriba
+            dy = displacement[1] if self.calibrated else -displacement[1]
+            direction_deg = math.degrees(math.atan2(dy, displacement[0])) % 360.0
+            direction = self.DIRECTIONS[int(((direction_deg + 22.5) % 360.0) // 45.0)]
+
+        return {
+            'track_id': int(self.track_ids[slot]),
+            'first_time': float(self.first_times[slot]),
+            'dwell_time_s': dwell_time,
+            'distance': distance,
+            # Con calibración las unidades son metros: se reporta en km/h
+            'avg_speed_kmh': average_speed * 3.6 if (average_speed is not None and self.calibrated) else None,
+            'avg_speed_px_s': average_speed if (average_speed is not None and not self.calibrated) else None,
+            'direction_deg': direction_deg,
+            'direction': direction,
+            'vote_sums': self.vote_sums[slot].copy(),
+            'vote_hits': self.vote_hits[slot].copy()
+        }
+
+    def reset(self):
+        """Descartar todos los tracks"""
+        self.slot_of.clear()
+        self.frame_index = 0
+        self.lengths[:] = 0
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
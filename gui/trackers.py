@@ -0,0 +1,288 @@
+"""
+Backends de tracking independientes de la inferencia
+
+El modelo solo detecta (model.predict) y el tracker recibe las detecciones
+ya filtradas a clases de vehículos:
+
+    bytetrack  BYTETracker de ultralytics
+    botsort    BOT-SORT de ultralytics (compensación de movimiento de cámara)
+    iou        Tracker ligero por IoU y centroides, para nodos con poca CPU
+
+Todos devuelven un arreglo N x 8 [x1, y1, x2, y2, id, confianza, clase, índice]
+con los tracks emparejados en el frame.
+
+Comparación de tiempo de tracking e intercambios de ID sobre un clip:
+    python -m gui.trackers trafico.mp4
+"""
+
+import argparse
+import functools
+import inspect
+import time
+import cv2
+import numpy as np
+
+TRACKER_TYPES = ('bytetrack', 'botsort', 'iou')
+
+def box_iou(boxes_a, boxes_b):
+    """Matriz IoU entre dos conjuntos de cajas xyxy"""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+def create_tracker(tracker_type="bytetrack", params=None, frame_rate=30):
+    """Crear un tracker por tipo con parámetros que reemplazan los valores por defecto"""
+    if tracker_type not in TRACKER_TYPES:
+        raise ValueError(f"Tracker desconocido: {tracker_type} (opciones: {', '.join(TRACKER_TYPES)})")
+    if tracker_type == 'iou':
+        return IoUTracker(**(params or {}))
+    return UltralyticsTracker(tracker_type, params, frame_rate)
+
+@functools.lru_cache(maxsize=None)
+def tracker_parameters(tracker_type):
+    """Nombres de parámetros válidos de un tipo de tracker (None si no se pueden consultar)"""
+    if tracker_type == 'iou':
+        return frozenset(inspect.signature(IoUTracker.__init__).parameters) - {'self'}
+    try:
+        defaults = _tracker_defaults(tracker_type)
+    except ImportError:  # Sin ultralytics se valida al crear el tracker
+        return None
+    return frozenset(defaults) - {'tracker_type'}
+
+def _tracker_defaults(tracker_type):
+    """Parámetros por defecto del yaml de tracker incluido en ultralytics"""
+    from ultralytics.utils.checks import check_yaml
+    try:
+        from ultralytics.utils import YAML  # Versiones recientes (reemplaza a yaml_load)
+    except ImportError:
+        from ultralytics.utils import yaml_load
+        return yaml_load(check_yaml(f"{tracker_type}.yaml"))
+    return YAML.load(check_yaml(f"{tracker_type}.yaml"))
+
+class UltralyticsTracker:
+    """BYTETracker o BOT-SORT de ultralytics usados fuera de model.track"""
+
+    def __init__(self, tracker_type="bytetrack", params=None, frame_rate=30):
+        from ultralytics.trackers.bot_sort import BOTSORT
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import IterableSimpleNamespace
+
+        # Parámetros por defecto del yaml incluido en ultralytics, con los de la configuración encima
+        settings = _tracker_defaults(tracker_type)
+        settings.update(params or {})
+        tracker_class = BOTSORT if tracker_type == 'botsort' else BYTETracker
+        self.tracker = tracker_class(args=IterableSimpleNamespace(**settings), frame_rate=frame_rate)
+
+    @property
+    def lost_track_frames(self):
+        """Frames que se conserva un track perdido (frame_rate / 30 * track_buffer)"""
+        return self.tracker.max_time_lost
+
+    def update(self, detections, frame):
+        """detections: Boxes de ultralytics en numpy (result.boxes.cpu().numpy(), ya filtradas)"""
+        tracks = self.tracker.update(detections, frame)
+        return tracks if len(tracks) else np.empty((0, 8), dtype=np.float32)
+
+    def reset(self):
+        self.tracker.reset()
+
+class IoUTracker:
+    """Tracker por IoU con respaldo por distancia de centroides
+
+    Predice cada track con velocidad constante, empareja primero por IoU y
+    luego, entre lo que quedó libre, por distancia de centroides relativa al
+    tamaño de la caja. Todo en numpy, sin filtro de Kalman.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_distance=0.5, max_missed=30,
+                 new_track_confidence=0.4, min_confidence=0.1):
+        self.iou_threshold = iou_threshold  # IoU mínimo para emparejar
+        self.centroid_distance = centroid_distance  # Distancia máxima de centros, en diagonales de la caja
+        self.max_missed = max_missed  # Frames sin detección antes de descartar un track
+        self.new_track_confidence = new_track_confidence  # Confianza mínima para iniciar un track
+        self.min_confidence = min_confidence  # Confianza mínima para considerar una detección
+        self.reset()
+
+    @property
+    def lost_track_frames(self):
+        return self.max_missed
+
+    def reset(self):
+        self.next_id = 1
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.velocities = np.empty((0, 2), dtype=np.float32)  # px/frame del centro
+        self.missed = np.empty(0, dtype=np.int64)
+
+    def update(self, detections, frame=None):
+        boxes = np.asarray(detections.xyxy, dtype=np.float32).reshape(-1, 4)
+        confidences = np.asarray(detections.conf, dtype=np.float32).reshape(-1)
+        classes = np.asarray(detections.cls, dtype=np.float32).reshape(-1)
+        indexes = np.flatnonzero(confidences >= self.min_confidence)
+        boxes = boxes[indexes]
+
+        # Posición predicha de cada track según los frames que lleva sin verse
+        steps = (self.missed + 1).astype(np.float32)[:, None]
+        predicted = self.boxes + np.tile(self.velocities * steps, 2)
+        track_rows, det_rows = self._match(predicted, boxes)
+
+        # Actualizar tracks emparejados
+        old_centers = (self.boxes[track_rows, :2] + self.boxes[track_rows, 2:]) / 2
+        new_centers = (boxes[det_rows, :2] + boxes[det_rows, 2:]) / 2
+        velocity = (new_centers - old_centers) / steps[track_rows]
+        self.velocities[track_rows] = 0.5 * self.velocities[track_rows] + 0.5 * velocity
+        self.boxes[track_rows] = boxes[det_rows]
+        self.missed += 1
+        self.missed[track_rows] = 0
+
+        # Iniciar tracks con las detecciones libres de confianza suficiente
+        free = np.ones(len(boxes), dtype=bool)
+        free[det_rows] = False
+        new_rows = np.flatnonzero(free & (confidences[indexes] >= self.new_track_confidence))
+        new_ids = np.arange(self.next_id, self.next_id + len(new_rows), dtype=np.int64)
+        self.next_id += len(new_rows)
+
+        output_ids = np.concatenate([self.ids[track_rows], new_ids])
+        output_rows = np.concatenate([det_rows, new_rows]).astype(np.int64)
+
+        self.ids = np.concatenate([self.ids, new_ids])
+        self.boxes = np.concatenate([self.boxes, boxes[new_rows]])
+        self.velocities = np.concatenate([self.velocities, np.zeros((len(new_rows), 2), dtype=np.float32)])
+        self.missed = np.concatenate([self.missed, np.zeros(len(new_rows), dtype=np.int64)])
+
+        # Descartar tracks perdidos hace demasiado
+        alive = self.missed <= self.max_missed
+        self.ids, self.boxes = self.ids[alive], self.boxes[alive]
+        self.velocities, self.missed = self.velocities[alive], self.missed[alive]
+
+        source_indexes = indexes[output_rows]
+        return np.column_stack([
+            boxes[output_rows],
+            output_ids,
+            confidences[source_indexes],
+            classes[source_indexes],
+            source_indexes
+        ]).astype(np.float32)
+
+    def _match(self, predicted, boxes):
+        """Emparejamiento greedy: IoU descendente y luego distancia de centroides ascendente"""
+        empty = np.empty(0, dtype=np.int64)
+        if not len(predicted) or not len(boxes):
+            return empty, empty
+
+        track_taken = np.zeros(len(predicted), dtype=bool)
+        det_taken = np.zeros(len(boxes), dtype=bool)
+        track_rows, det_rows = [], []
+
+        def assign(valid, order):
+            for flat in order:
+                t, d = divmod(int(flat), len(boxes))
+                if not valid[t, d]:
+                    break
+                if track_taken[t] or det_taken[d]:
+                    continue
+                track_taken[t] = det_taken[d] = True
+                track_rows.append(t)
+                det_rows.append(d)
+
+        iou = box_iou(predicted, boxes)
+        assign(iou >= self.iou_threshold, np.argsort(-iou, axis=None))
+
+        centers_t = (predicted[:, :2] + predicted[:, 2:]) / 2
+        centers_d = (boxes[:, :2] + boxes[:, 2:]) / 2
+        diagonals = np.linalg.norm(predicted[:, 2:] - predicted[:, :2], axis=1)[:, None] + 1e-9
+        distance = np.linalg.norm(centers_t[:, None] - centers_d[None], axis=2) / diagonals
+        assign(distance <= self.centroid_distance, np.argsort(distance, axis=None))
+
+        return np.array(track_rows, dtype=np.int64), np.array(det_rows, dtype=np.int64)
+
+def count_id_switches(frames_tracks, iou_threshold=0.5, memory=30):
+    """Aproximar intercambios de ID: un ID nuevo que aparece sobre un track perdido hace poco
+
+    frames_tracks: por frame, arreglo N x 8 devuelto por el tracker.
+    """
+    seen = set()
+    last_box = {}  # id -> (caja, frame)
+    switches = 0
+    for frame_index, tracks in enumerate(frames_tracks):
+        ids = tracks[:, 4].astype(np.int64)
+        current = set(ids.tolist())
+        lost = [
+            track_id for track_id, (_, last_frame) in last_box.items()
+            if track_id not in current and frame_index - last_frame <= memory
+        ]
+        for row, track_id in enumerate(ids.tolist()):
+            if track_id in seen:
+                continue
+            seen.add(track_id)
+            if lost:
+                lost_boxes = np.array([last_box[t][0] for t in lost], dtype=np.float32)
+                if box_iou(tracks[row:row + 1, :4], lost_boxes).max() > iou_threshold:
+                    switches += 1
+        for row, track_id in enumerate(ids.tolist()):
+            last_box[track_id] = (tracks[row, :4], frame_index)
+    return switches
+
+def benchmark(video_path, model_path="yolov8n.pt", tracker_types=TRACKER_TYPES, imgsz=640, conf=0.25):
+    """Detectar una vez y medir cada tracker sobre las mismas detecciones"""
+    from ultralytics import YOLO
+    from .config import DEFAULT_CONFIG
+
+    model = YOLO(model_path, task="detect")
+    vehicle_class_ids = [
+        class_id for class_id, name in model.names.items() if name in DEFAULT_CONFIG['clases_vehiculos']
+    ]
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise Exception(f"No se pudo abrir el video: {video_path}")
+    frame_rate = int(round(cap.get(cv2.CAP_PROP_FPS) or 30))
+    detections = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        boxes = model.predict(frame, imgsz=imgsz, conf=conf, verbose=False)[0].boxes.cpu().numpy()
+        detections.append(boxes[np.isin(boxes.cls.astype(np.int64), vehicle_class_ids)])
+    cap.release()
+
+    results = {}
+    for tracker_type in tracker_types:
+        tracker = create_tracker(tracker_type, frame_rate=frame_rate)
+        cap = cv2.VideoCapture(str(video_path))  # BOT-SORT usa la imagen para compensar el movimiento de cámara
+        frames_tracks = []
+        elapsed = 0.0
+        for frame_detections in detections:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            start = time.perf_counter()
+            frames_tracks.append(tracker.update(frame_detections, frame))
+            elapsed += time.perf_counter() - start
+        cap.release()
+
+        unique_ids = {int(track_id) for tracks in frames_tracks for track_id in tracks[:, 4]}
+        results[tracker_type] = {
+            'ms_per_frame': 1000.0 * elapsed / max(1, len(frames_tracks)),
+            'unique_ids': len(unique_ids),
+            'id_switches': count_id_switches(frames_tracks)
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar backends de tracking sobre un clip")
+    parser.add_argument("video")
+    parser.add_argument("--modelo", default="yolov8n.pt")
+    parser.add_argument("--trackers", nargs="+", choices=TRACKER_TYPES, default=list(TRACKER_TYPES))
+    args = parser.parse_args()
+
+    results = benchmark(args.video, args.modelo, args.trackers)
+    print(f"{'Tracker':<12}{'ms/frame':>10}{'IDs únicos':>12}{'Cambios de ID':>15}")
+    for tracker_type, result in results.items():
+        print(f"{tracker_type:<12}{result['ms_per_frame']:>10.2f}{result['unique_ids']:>12}{result['id_switches']:>15}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import cv2
+import queue
+import shutil
+import subprocess
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+class VideoExporter:
+    """Exportador de video anotado con codificación en un hilo dedicado"""
+
+    # Códecs FourCC de OpenCV -> codificadores de ffmpeg
+    FFMPEG_CODECS = {
+        'mp4v': 'mpeg4',
+        'avc1': 'libx264',
+        'h264': 'libx264',
+        'hevc': 'libx265',
+        'mjpg': 'mjpeg'
+    }
+
+    def __init__(self, output_path, fps=30.0, codec="mp4v", bitrate=None, output_size=None,
+                 queue_size=64, events_only=False, pre_event_seconds=2.0, post_event_seconds=3.0):
+        self.output_path = Path(output_path)
+        self.fps = fps
+        self.codec = codec
+        self.bitrate = bitrate  # Ej: "2M"; requiere ffmpeg instalado
+        self.output_size = output_size  # (ancho, alto) o None para usar la resolución de la fuente
+        self.events_only = events_only
+        self.pre_event_frames = max(1, int(pre_event_seconds * fps))
+        self.post_event_frames = max(1, int(post_event_seconds * fps))
+
+        # Cola acotada: si el codificador se atrasa se descartan frames, nunca se bloquea la inferencia
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.encoder_thread = None
+        self.running = False
+
+        # Estadísticas
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.clips_written = []
+
+    def start(self):
+        """Iniciar hilo codificador"""
+        if self.running:
+            return
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.running = True
+        self.encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self.encoder_thread.start()
+
+    def write(self, frame, event=False):
+        """Encolar un frame anotado sin bloquear; event marca la aparición de un vehículo nuevo"""
+        if not self.running:
+            return
+        try:
+            # Copia obligatoria: el renderizador reutiliza sus buffers
+            self.frame_queue.put_nowait((frame.copy(), event))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def stop(self, timeout=5.0):
+        """Vaciar la cola, cerrar el archivo y detener el hilo codificador"""
+        self.running = False
+        if not self.encoder_thread or not self.encoder_thread.is_alive():
+            return
+        # El centinela se encola esperando a que el hilo vacíe la cola, con límite por si se atasca
+        try:
+            self.frame_queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("Advertencia: el codificador de video no respondió; se descartan los frames en cola")
+            return
+        self.encoder_thread.join(timeout=timeout)
+
+    def get_stats(self):
+        """Obtener estadísticas de exportación"""
+        return {
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'queue_depth': self.frame_queue.qsize(),
+            'clips_written': list(self.clips_written)
+        }
+
+    def _encode_loop(self):
+        """Bucle del hilo codificador"""
+        writer = None
+        pre_roll = deque(maxlen=self.pre_event_frames)
+        remaining = 0  # Frames pendientes del clip de evento actual
+
+        try:
+            while True:
+                item = self.frame_queue.get()
+                if item is None:
+                    break
+
+                frame, event = item
+                frame = self._resize(frame)
+
+                if not self.events_only:
+                    if writer is None:
+                        writer = self._open_writer(self.output_path, frame)
+                    self._write_frame(writer, frame)
+                    continue
+
+                # Modo solo eventos: clips cortos alrededor de cada vehículo nuevo
+                if event:
+                    if writer is None:
+                        writer = self._open_writer(self._clip_path(), frame)
+                        for buffered in pre_roll:
+                            self._write_frame(writer, buffered)
+                        pre_roll.clear()
+                    remaining = self.post_event_frames
+
+                if writer is not None:
+                    self._write_frame(writer, frame)
+                    remaining -= 1
+                    if remaining <= 0:
+                        writer.release()
+                        writer = None
+                else:
+                    pre_roll.append(frame)
+        except Exception as e:
+            print(f"Error exportando video: {e}")
+        finally:
+            # Si el hilo muere (códec inválido, disco lleno, ffmpeg cerrado) no se encolan más frames
+            self.running = False
+            if writer is not None:
+                writer.release()
+
+    def _resize(self, frame):
+        """Ajustar el frame a la resolución de salida si hace falta"""
+        if self.output_size and (frame.shape[1], frame.shape[0]) != tuple(self.output_size):
+            return cv2.resize(frame, tuple(self.output_size), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _write_frame(self, writer, frame):
+        writer.write(frame)
+        self.frames_written += 1
+
+    def _clip_path(self):
+        """Nombre de archivo para un clip de evento"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        return self.output_path.with_name(f"{self.output_path.stem}_evento_{timestamp}{self.output_path.suffix}")
+
+    def _open_writer(self, path, frame):
+        """Abrir el escritor de video adecuado para el códec y bitrate configurados"""
+        height, width = frame.shape[:2]
+        self.clips_written.append(str(path))
+
+        if self.bitrate:
+            if shutil.which("ffmpeg"):
+                return FFmpegWriter(path, self.fps, (width, height), self.FFMPEG_CODECS.get(self.codec.lower(), self.codec), self.bitrate)
+            print("Advertencia: ffmpeg no está instalado, se ignora el bitrate configurado")
+
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*self.codec), self.fps, (width, height))
+        if not writer.isOpened():
+            raise Exception(f"No se pudo abrir el archivo de salida: {path}")
+        return writer
+
+class FFmpegWriter:
+    """Escritor de video mediante ffmpeg para controlar códec y bitrate"""
+
+    def __init__(self, path, fps, size, codec, bitrate):
+        width, height = size
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+            "-c:v", codec, "-b:v", str(bitrate),
+            "-pix_fmt", "yuv420p",
+            str(path)
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.tobytes())
+
+    def release(self):
+        self.process.stdin.close()
+        self.process.wait()